@@ -1,33 +1,56 @@
 # ai/app/enroll2_auto/config.py
 from __future__ import annotations
 
-from dataclasses import dataclass, field
-from typing import List
+from dataclasses import dataclass
+from typing import Tuple
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Enroll2AutoConfig:
     """
     Comfortable auto-enrollment config:
     - Front is "near-front" acceptance (comfortable).
     - Left/Right/Up/Down require DELTA turn relative to the captured front baseline.
+
+    Frozen (read on every loop iteration, never changed at runtime); derive a variant
+    with dataclasses.replace(cfg, ...).
     """
 
     # ---------- pipeline ----------
     ai_fps: float = 12.0
+    # Loop rate while no single face is in the ROI (nothing to track yet).
+    ai_fps_idle: float = 4.0
+    # Run detection on every Nth *new* camera frame (unchanged frames are always skipped).
+    detect_every_n_frames: int = 2
 
     # utils_auto.quality_score() returns 0..100
     # Testing low light: 25..40
     # Production: 65..75
     min_quality_score: float = 25.0
+    # Downsample the face crop to this longer side before scoring quality (0 = full res;
+    # ~160 is plenty for the statistics). Cheaper on large close-up faces, but downsampling
+    # raises the Laplacian variance (sharper per pixel), so retune min_quality_score upward.
+    quality_max_side: int = 0
+    # Faces below this detector score are rejected before quality_score() runs
+    # (low det_score tracks blur/bad light closely, so the Laplacian is skipped). 0 = off.
+    # Values above the recognizer's MIN_FACE_DET_SCORE change which faces can enroll
+    # (and drop the low-light fallback detections), so keep it off unless retuning.
+    quality_min_det_score: float = 0.0
+    # Score sharpness/brightness/contrast on the aligned recognition crop (112x112) instead
+    # of the bbox crop; the same crop is then reused for the embedding. Fixed, small input,
+    # but the sharpness scale differs from the bbox crop: retune min_quality_score.
+    quality_on_aligned_crop: bool = False
 
     # ---------- enrollment steps ----------
-    steps: List[str] = field(default_factory=lambda: ["front", "left", "right", "up", "down"])
+    steps: Tuple[str, ...] = ("front", "left", "right", "up", "down")
 
     # Testing: 3-5 (faster)
     # Production best: 7
     target_per_pose: int = 1
     max_per_pose: int = 3
+    # Drop a capture whose cosine similarity to the previous capture of the same pose is
+    # above this (a near-identical frame only skews the mean). 0 disables.
+    dedup_cos_sim: float = 0.995
 
     # Must hold correct pose before capture
     pose_stable_ms: float = 320.0
@@ -43,6 +66,10 @@ class Enroll2AutoConfig:
     roi_y0: float = 0.12
     roi_x1: float = 0.78
     roi_y1: float = 0.88
+    # Run detection on the ROI (+ this padding, as a fraction of ROI size) instead of the
+    # full frame; faces are only accepted inside the ROI anyway.
+    detect_roi_only: bool = True
+    detect_roi_pad_frac: float = 0.10
 
     # ---------- face size gating ----------
     # relaxed a bit for laptop testing
@@ -76,6 +103,11 @@ class Enroll2AutoConfig:
     # Set True only if left/right are reversed for your camera feed.
     flip_yaw: bool = False
 
+    # Read yaw/pitch from InsightFace's landmark_3d_68 pose head (buffalo_l) when present
+    # instead of running solvePnP on the 5 keypoints. Its sign convention may differ from
+    # solvePnP; check left/right on your feed (flip_yaw) when enabling.
+    use_model_pose: bool = False
+
     # Testing only: allow "front" step to proceed even if pose cannot be estimated
     # Keep False for production.
     allow_unknown_pose_front: bool = True
@@ -1,10 +1,87 @@
 # app/enroll2_auto/hud.py
 from __future__ import annotations
 
+import re
+import threading
+from dataclasses import dataclass
+from functools import lru_cache
 from typing import Optional, Tuple, Dict, Any
 import cv2
 import numpy as np
 
+Box = Tuple[int, int, int, int]
+
+# BGR colors
+_COL_BLACK = (0, 0, 0)
+_COL_WHITE = (245, 245, 245)
+_COL_RED = (40, 40, 220)
+_COL_AMBER = (40, 170, 255)
+_COL_GREEN = (80, 220, 80)
+_COL_CYAN = (30, 200, 255)
+_COL_ROI_YELLOW = (0, 255, 255)
+_COL_FACE_BLUE = (255, 0, 0)
+
+
+# Per-thread scratch buffers reused across frames (frame copy + per-pill overlays).
+_scratch = threading.local()
+
+
+def _scratch_frame(shape: Tuple[int, ...], dtype) -> np.ndarray:
+    buf = getattr(_scratch, "frame", None)
+    if buf is None or buf.shape != shape or buf.dtype != dtype:
+        buf = np.empty(shape, dtype=dtype)
+        _scratch.frame = buf
+    return buf
+
+
+def _scratch_overlay(roi: np.ndarray) -> np.ndarray:
+    bufs = getattr(_scratch, "overlays", None)
+    if bufs is None:
+        bufs = _scratch.overlays = {}
+    key = (roi.shape, roi.dtype.str)
+    buf = bufs.get(key)
+    if buf is None:
+        if len(bufs) >= 32:  # frame size changed a lot; don't grow without bound
+            bufs.clear()
+        buf = bufs[key] = np.empty(roi.shape, dtype=roi.dtype)
+    np.copyto(buf, roi)
+    return buf
+
+
+@dataclass(frozen=True)
+class LayoutSpec:
+    """Pill/text positions for one frame size (computed once per (h, w))."""
+    banner_box: Box
+    banner_text_org: Tuple[int, int]
+    stats_box: Box
+    stats_text_x: int
+    stats_text_y: int
+    progress_box: Box
+    progress_text_org: Tuple[int, int]
+    message_box: Box
+    message_text_org: Tuple[int, int]
+
+
+@lru_cache(maxsize=16)
+def _layout(h: int, w: int) -> LayoutSpec:
+    bx1, by1 = 12, 12
+    bx2, by2 = min(w - 12, 12 + 980), 58
+    sx1, sy1 = 12, 72
+    sx2, sy2 = 420, 176
+    mx1, my1 = 12, h - 70
+    mx2, my2 = min(w - 12, 12 + 1200), h - 16
+    return LayoutSpec(
+        banner_box=(bx1, by1, bx2, by2),
+        banner_text_org=(bx1 + 14, by1 + 32),
+        stats_box=(sx1, sy1, sx2, sy2),
+        stats_text_x=sx1 + 14,
+        stats_text_y=sy1 + 34,
+        progress_box=(12, 190, min(w - 12, 12 + 980), 230),
+        progress_text_org=(26, 218),
+        message_box=(mx1, my1, mx2, my2),
+        message_text_org=(mx1 + 14, my1 + 36),
+    )
+
 
 def _put_text_shadow(
     img: np.ndarray,
@@ -23,8 +100,21 @@ def _put_text_shadow(
 def _rounded_rect(img: np.ndarray, x1: int, y1: int, x2: int, y2: int, radius: int, color: Tuple[int, int, int], alpha: float = 0.55):
     """
     Simple rounded rectangle fill using an overlay.
+
+    Only the pill's own sub-rectangle is copied and blended (not the whole frame); pixels
+    outside the shape are untouched either way, so the output is identical.
     """
-    overlay = img.copy()
+    h, w = img.shape[:2]
+    rx1, ry1 = max(0, x1), max(0, y1)
+    rx2, ry2 = min(w, x2 + 1), min(h, y2 + 1)
+    if rx2 <= rx1 or ry2 <= ry1:
+        return
+
+    roi = img[ry1:ry2, rx1:rx2]
+    overlay = _scratch_overlay(roi)
+    # shift to ROI-local coordinates (cv2 clips anything outside the ROI)
+    x1, x2 = x1 - rx1, x2 - rx1
+    y1, y2 = y1 - ry1, y2 - ry1
     # center rect
     cv2.rectangle(overlay, (x1 + radius, y1), (x2 - radius, y2), color, -1)
     cv2.rectangle(overlay, (x1, y1 + radius), (x2, y2 - radius), color, -1)
@@ -34,7 +124,12 @@ def _rounded_rect(img: np.ndarray, x1: int, y1: int, x2: int, y2: int, radius: i
     cv2.circle(overlay, (x1 + radius, y2 - radius), radius, color, -1)
     cv2.circle(overlay, (x2 - radius, y2 - radius), radius, color, -1)
 
-    cv2.addWeighted(overlay, alpha, img, 1.0 - alpha, 0, img)
+    cv2.addWeighted(overlay, alpha, roi, 1.0 - alpha, 0, roi)
+
+
+# Message keywords that pick the accent color (checked in this order).
+_AMBER_MSG_RE = re.compile(r"multi|single face|need|hold|move|place")
+_GREEN_MSG_RE = re.compile(r"captured|saved|✅")
 
 
 def _status_color(hud: Dict[str, str]) -> Tuple[int, int, int]:
@@ -42,21 +137,27 @@ def _status_color(hud: Dict[str, str]) -> Tuple[int, int, int]:
     Pick a UI color based on message/state.
     We keep it simple and robust based on text fields.
     """
-    msg = (hud.get("message") or hud.get("msg") or "").lower()
-    status = (hud.get("status") or "").lower()
-    multi = (hud.get("multi_face") or hud.get("multi") or "").lower()
+    return _status_color_cached(
+        hud.get("message") or hud.get("msg") or "",
+        hud.get("status") or "",
+        hud.get("multi_face") or hud.get("multi") or "",
+    )
+
+
+@lru_cache(maxsize=128)
+def _status_color_cached(msg: str, status: str, multi: str) -> Tuple[int, int, int]:
+    msg = msg.lower()
+    status = status.lower()
 
     if status in ("error", "failed"):
-        return (40, 40, 220)  # red-ish
-    if "multiple" in msg or "multi" in msg or "single face" in msg or multi in ("1", "true", "yes"):
-        return (40, 170, 255)  # amber
-    if "need" in msg or "hold" in msg or "move" in msg or "place" in msg:
-        return (40, 170, 255)  # amber
-    if "captured" in msg or "saved" in msg or "✅" in msg:
-        return (80, 220, 80)   # green
+        return _COL_RED
+    if multi.lower() in ("1", "true", "yes") or _AMBER_MSG_RE.search(msg):
+        return _COL_AMBER
+    if _GREEN_MSG_RE.search(msg):
+        return _COL_GREEN
     if status in ("running", "saving", "saved"):
-        return (80, 220, 80)
-    return (30, 200, 255)  # cyan default
+        return _COL_GREEN
+    return _COL_CYAN  # default
 
 
 def _format_progress(hud: Dict[str, str]) -> str:
@@ -66,13 +167,18 @@ def _format_progress(hud: Dict[str, str]) -> str:
     without requiring caller changes.
     """
     target = hud.get("target_per_pose") or hud.get("target") or ""
-    # Most callers pass collected as a string; try to parse common patterns:
-    # - "front=3,left=0,right=0,up=0,down=0"
-    # - "{'front':3,'left':0,...}"
     collected_raw = hud.get("collected") or ""
-
     if not collected_raw:
         return ""
+    # The HUD dict is rebuilt every frame but the strings rarely change.
+    return _format_progress_cached(str(target), str(collected_raw))
+
+
+@lru_cache(maxsize=256)
+def _format_progress_cached(target: str, collected_raw: str) -> str:
+    # Most callers pass collected as a string; try to parse common patterns:
+    # - "front=3,left=0,right=0,up=0,down=0"
+    # - "{'front':3,'left':0,...}"
 
     # normalize target
     try:
@@ -132,6 +238,8 @@ def draw_enroll2_auto_hud(
     roi: Tuple[int, int, int, int],
     primary_bbox: Optional[Tuple[int, int, int, int]],
     hud: Dict[str, str],
+    *,
+    reuse_buffer: bool = False,
 ) -> np.ndarray:
     """
     Production HUD overlay for auto enrollment.
@@ -144,23 +252,35 @@ def draw_enroll2_auto_hud(
       - collected (stringified dict or "front=3,left=0,...")
       - target_per_pose (optional)
       - overlay_roi_faces / overlay_multi_in_roi (optional)
+
+    `frame_bgr` may also be a cv2.cuda_GpuMat; it is downloaded once and drawn on host
+    (all HUD blending is sub-ROI, so there is no full-frame device round-trip to save).
+
+    With reuse_buffer=True the result is drawn into a per-thread scratch frame instead of a
+    fresh copy; it is only valid until the next call on the same thread (e.g. encode it first).
     """
-    img = frame_bgr.copy()
+    if not isinstance(frame_bgr, np.ndarray) and hasattr(frame_bgr, "download"):
+        frame_bgr = frame_bgr.download()
+    if reuse_buffer:
+        img = _scratch_frame(frame_bgr.shape, frame_bgr.dtype)
+        np.copyto(img, frame_bgr)
+    else:
+        img = frame_bgr.copy()
     h, w = img.shape[:2]
+    L = _layout(h, w)
     x0, y0, x1, y1 = roi
 
     # Colors
     accent = _status_color(hud)
 
     # ROI guide
-    ROI_YELLOW = (0, 255, 255)  # BGR yellow
-    cv2.rectangle(img, (x0, y0), (x1, y1), ROI_YELLOW, 2)
+    cv2.rectangle(img, (x0, y0), (x1, y1), _COL_ROI_YELLOW, 2)
     _put_text_shadow(
         img,
         "ENROLL AUTO: keep face inside box",
         (x0, max(26, y0 - 10)),
         scale=0.7,
-        color=ROI_YELLOW,
+        color=_COL_ROI_YELLOW,
         thick=2,
         font=cv2.FONT_HERSHEY_DUPLEX,
     )
@@ -168,8 +288,7 @@ def draw_enroll2_auto_hud(
     # Primary bbox
     if primary_bbox is not None:
         px1, py1, px2, py2 = primary_bbox
-        FACE_BLUE = (255, 0, 0)  # BGR blue
-        cv2.rectangle(img, (px1, py1), (px2, py2), FACE_BLUE, 3)
+        cv2.rectangle(img, (px1, py1), (px2, py2), _COL_FACE_BLUE, 3)
 
     # -------- Top banner pill --------
     step = hud.get("step") or hud.get("required") or ""
@@ -178,11 +297,9 @@ def draw_enroll2_auto_hud(
     msg = hud.get("message") or hud.get("msg") or hud.get("last_message") or ""
 
     banner_text = f"{status.upper() if status else 'ENROLL'}  •  {step.upper() if step else ''}  {('— ' + instruction) if instruction else ''}"
-    bx1, by1 = 12, 12
-    bx2, by2 = min(w - 12, 12 + 980), 58
-    _rounded_rect(img, bx1, by1, bx2, by2, radius=14, color=(0, 0, 0), alpha=0.35)
-    _rounded_rect(img, bx1, by1, bx2, by2, radius=14, color=accent, alpha=0.18)
-    _put_text_shadow(img, banner_text.strip(), (bx1 + 14, by1 + 32), scale=0.78, color=(245, 245, 245), thick=2)
+    _rounded_rect(img, *L.banner_box, radius=14, color=_COL_BLACK, alpha=0.35)
+    _rounded_rect(img, *L.banner_box, radius=14, color=accent, alpha=0.18)
+    _put_text_shadow(img, banner_text.strip(), L.banner_text_org, scale=0.78, color=_COL_WHITE, thick=2)
 
     # -------- Stats box --------
     last_pose = hud.get("last_pose") or hud.get("pose") or ""
@@ -190,36 +307,33 @@ def draw_enroll2_auto_hud(
     roi_faces = hud.get("overlay_roi_faces") or hud.get("roi_faces") or ""
     multi_in_roi = hud.get("overlay_multi_in_roi") or hud.get("multi_in_roi") or ""
 
-    sx1, sy1 = 12, 72
-    sx2, sy2 = 420, 176
-    _rounded_rect(img, sx1, sy1, sx2, sy2, radius=16, color=(0, 0, 0), alpha=0.35)
+    _rounded_rect(img, *L.stats_box, radius=16, color=_COL_BLACK, alpha=0.35)
 
-    y = sy1 + 34
-    _put_text_shadow(img, f"Pose: {last_pose}", (sx1 + 14, y), scale=0.72, color=(245, 245, 245), thick=2)
+    tx = L.stats_text_x
+    y = L.stats_text_y
+    _put_text_shadow(img, f"Pose: {last_pose}", (tx, y), scale=0.72, color=_COL_WHITE, thick=2)
     y += 30
-    _put_text_shadow(img, f"Quality: {last_q}", (sx1 + 14, y), scale=0.72, color=(245, 245, 245), thick=2)
+    _put_text_shadow(img, f"Quality: {last_q}", (tx, y), scale=0.72, color=_COL_WHITE, thick=2)
     y += 30
 
     # Face count hints if provided
     if roi_faces != "":
-        _put_text_shadow(img, f"Faces in ROI: {roi_faces}", (sx1 + 14, y), scale=0.68, color=(245, 245, 245), thick=2)
+        _put_text_shadow(img, f"Faces in ROI: {roi_faces}", (tx, y), scale=0.68, color=_COL_WHITE, thick=2)
         y += 28
     if str(multi_in_roi).lower() in ("1", "true", "yes"):
-        _put_text_shadow(img, "Multiple faces detected — show only one face", (sx1 + 14, y), scale=0.62, color=(40, 170, 255), thick=2)
+        _put_text_shadow(img, "Multiple faces detected — show only one face", (tx, y), scale=0.62, color=_COL_AMBER, thick=2)
 
     # -------- Progress line (bottom of banner) --------
     progress = _format_progress(hud)
     if progress:
-        _rounded_rect(img, 12, 190, min(w - 12, 12 + 980), 230, radius=14, color=(0, 0, 0), alpha=0.30)
-        _put_text_shadow(img, progress, (26, 218), scale=0.62, color=(245, 245, 245), thick=2)
+        _rounded_rect(img, *L.progress_box, radius=14, color=_COL_BLACK, alpha=0.30)
+        _put_text_shadow(img, progress, L.progress_text_org, scale=0.62, color=_COL_WHITE, thick=2)
 
     # -------- Message line --------
     if msg:
         # message box near bottom
-        mx1, my1 = 12, h - 70
-        mx2, my2 = min(w - 12, 12 + 1200), h - 16
-        _rounded_rect(img, mx1, my1, mx2, my2, radius=14, color=(0, 0, 0), alpha=0.35)
-        _rounded_rect(img, mx1, my1, mx2, my2, radius=14, color=accent, alpha=0.14)
-        _put_text_shadow(img, msg, (mx1 + 14, my1 + 36), scale=0.70, color=(245, 245, 245), thick=2)
+        _rounded_rect(img, *L.message_box, radius=14, color=_COL_BLACK, alpha=0.35)
+        _rounded_rect(img, *L.message_box, radius=14, color=accent, alpha=0.14)
+        _put_text_shadow(img, msg, L.message_text_org, scale=0.70, color=_COL_WHITE, thick=2)
 
     return img
@@ -1,13 +1,18 @@
 from __future__ import annotations
 
 import os
+import threading
+import time
 from dataclasses import dataclass
-from typing import List, Tuple, Optional
+from typing import Dict, List, Tuple, Optional, Union
 
 import numpy as np
 from insightface.app import FaceAnalysis
+from insightface.app.common import Face
+from insightface.utils import face_align
 
-from ..utils import l2_normalize
+from ..utils import l2_normalize, l2_normalize_rows
+from ..vision.recognizer import match_gallery
 
 
 def _env_bool(name: str, default: bool) -> bool:
@@ -37,7 +42,33 @@ def _clamp(v: float, lo: float, hi: float) -> float:
     return max(lo, min(hi, v))
 
 
-def _pick_providers(use_gpu: bool) -> list[str]:
+def _cuda_provider() -> Union[str, Tuple[str, dict]]:
+    """
+    CUDA EP with ORT_CUDNN_CONV_ALGO_SEARCH (default HEURISTIC): the EXHAUSTIVE default
+    benchmarks every conv on first use, which is most of the cold-start stall.
+    Set it to "" to keep ONNX Runtime's own default.
+    """
+    algo = _env_str("ORT_CUDNN_CONV_ALGO_SEARCH", "HEURISTIC").upper()
+    if not algo:
+        return "CUDAExecutionProvider"
+    return ("CUDAExecutionProvider", {"cudnn_conv_algo_search": algo})
+
+
+def _tensorrt_provider() -> Union[str, Tuple[str, dict]]:
+    """
+    TensorRT EP with an on-disk engine cache (ORT_TRT_CACHE_DIR, default ./trt_cache) so the
+    engine is built on the first start only, plus FP16 engines (ORT_TRT_FP16, default on).
+    Set ORT_TRT_CACHE_DIR to "" to disable the cache.
+    """
+    opts: dict = {"trt_fp16_enable": _env_bool("ORT_TRT_FP16", True)}
+    cache_dir = _env_str("ORT_TRT_CACHE_DIR", "./trt_cache")
+    if cache_dir:
+        opts["trt_engine_cache_enable"] = True
+        opts["trt_engine_cache_path"] = cache_dir
+    return ("TensorrtExecutionProvider", opts)
+
+
+def _pick_providers(use_gpu: bool) -> list:
     """
     ORT_PROVIDER:
       - auto (default): use CUDA if USE_GPU=1 else CPU
@@ -50,17 +81,75 @@ def _pick_providers(use_gpu: bool) -> list[str]:
     if ort_provider == "cpu":
         return ["CPUExecutionProvider"]
     if ort_provider == "cuda":
-        return ["CUDAExecutionProvider", "CPUExecutionProvider"]
+        return [_cuda_provider(), "CPUExecutionProvider"]
     if ort_provider == "tensorrt":
-        return ["TensorrtExecutionProvider", "CUDAExecutionProvider", "CPUExecutionProvider"]
+        return [_tensorrt_provider(), _cuda_provider(), "CPUExecutionProvider"]
 
     # auto
     if use_gpu:
-        return ["CUDAExecutionProvider", "CPUExecutionProvider"]
+        return [_cuda_provider(), "CPUExecutionProvider"]
     return ["CPUExecutionProvider"]
 
 
 
+# Prepared FaceAnalysis apps, one per (model, providers, modules, ctx_id, det_size).
+# Building a recognizer again (service re-created, model "reload") reuses the warm ORT
+# sessions instead of loading a second copy and redoing cuDNN algo search + warmup.
+_APP_CACHE: Dict[Tuple[str, str, Tuple[str, ...], int, Tuple[int, int]], FaceAnalysis] = {}
+_APP_CACHE_LOCK = threading.Lock()
+
+
+def _get_face_analysis(
+    model_name: str,
+    providers: list,
+    allowed_modules: List[str],
+    ctx_id: int,
+    det_size: Tuple[int, int],
+) -> Tuple[FaceAnalysis, bool]:
+    """Returns (app, created); prepare() runs only when the app is created."""
+    key = (model_name, repr(providers), tuple(allowed_modules), int(ctx_id), tuple(det_size))
+    with _APP_CACHE_LOCK:
+        app = _APP_CACHE.get(key)
+        if app is not None:
+            return app, False
+        app = FaceAnalysis(name=model_name, providers=providers, allowed_modules=allowed_modules)
+        app.prepare(ctx_id=ctx_id, det_size=det_size)
+        _APP_CACHE[key] = app
+        return app, True
+
+
+def _kps5_from_cloud(pts: np.ndarray) -> np.ndarray:
+    xs = pts[:, 0]
+    ys = pts[:, 1]
+
+    # robust center
+    cx = float(np.median(xs))
+    cy = float(np.median(ys))
+
+    left_idx = np.where(xs < cx)[0]
+    right_idx = np.where(xs >= cx)[0]
+
+    # if split fails, just take extremes
+    if left_idx.size == 0 or right_idx.size == 0:
+        order = np.argsort(xs, kind="mergesort")
+        left_idx = order[: max(1, pts.shape[0] // 2)]
+        right_idx = order[max(1, pts.shape[0] // 2) :]
+
+    # Eyes: top-most (min y) in each half
+    le = pts[left_idx[np.argmin(ys[left_idx])]]
+    re_ = pts[right_idx[np.argmin(ys[right_idx])]]
+
+    # Mouth corners: bottom-most (max y) in each half
+    lm = pts[left_idx[np.argmax(ys[left_idx])]]
+    rm = pts[right_idx[np.argmax(ys[right_idx])]]
+
+    # Nose: closest to center (median)
+    d2 = (xs - cx) ** 2 + (ys - cy) ** 2
+    nose = pts[int(np.argmin(d2))]
+
+    return np.stack([le, re_, nose, lm, rm], axis=0).astype(np.float32, copy=False)
+
+
 def _to_kps5(kps_any) -> Optional[np.ndarray]:
     """
     Normalize landmarks to (5,2) float32 in the order expected by utils_auto.estimate_head_pose_deg:
@@ -96,36 +185,8 @@ def _to_kps5(kps_any) -> Optional[np.ndarray]:
 
     # (N,2) fallback (N >= 5)
     if kps.ndim == 2 and kps.shape[1] == 2 and kps.shape[0] >= 5:
-        pts = kps.astype(np.float32, copy=False)
-        xs = pts[:, 0]
-        ys = pts[:, 1]
-
-        # robust center
-        cx = float(np.median(xs))
-        cy = float(np.median(ys))
-
-        left_idx = np.where(xs < cx)[0]
-        right_idx = np.where(xs >= cx)[0]
-
-        # if split fails, just take extremes
-        if left_idx.size == 0 or right_idx.size == 0:
-            left_idx = np.argsort(xs)[: max(1, pts.shape[0] // 2)]
-            right_idx = np.argsort(xs)[max(1, pts.shape[0] // 2) :]
-
-        # Eyes: top-most (min y) in each half
-        le = pts[left_idx[np.argmin(ys[left_idx])]]
-        re_ = pts[right_idx[np.argmin(ys[right_idx])]]
-
-        # Mouth corners: bottom-most (max y) in each half
-        lm = pts[left_idx[np.argmax(ys[left_idx])]]
-        rm = pts[right_idx[np.argmax(ys[right_idx])]]
-
-        # Nose: closest to center (median)
-        d2 = (xs - cx) ** 2 + (ys - cy) ** 2
-        nose = pts[int(np.argmin(d2))]
-
-        out = np.stack([le, re_, nose, lm, rm], axis=0).astype(np.float32, copy=False)
-        return out
+        pts = np.ascontiguousarray(kps, dtype=np.float32)
+        return _kps5_from_cloud(pts)
 
     return None
 
@@ -133,9 +194,11 @@ def _to_kps5(kps_any) -> Optional[np.ndarray]:
 @dataclass
 class FaceDet:
     bbox: np.ndarray
-    emb: np.ndarray
+    emb: Optional[np.ndarray]  # None for FaceRecognizerAuto.detect() results
     kps: Optional[np.ndarray]
     det_score: float
+    # (pitch, yaw, roll) degrees from InsightFace's 3D-68 landmark head, if that model is loaded
+    pose: Optional[np.ndarray] = None
 
 
 class FaceRecognizerAuto:
@@ -152,6 +215,7 @@ class FaceRecognizerAuto:
         min_face_size: int = 40,
         det_size: tuple[int, int] = (640, 640),
         min_det_score: float = 0.25,  # lower than recognition pipeline for enrollment
+        use_model_pose: bool = False,
     ):
         use_gpu = _env_bool("USE_GPU", use_gpu)
 
@@ -162,17 +226,52 @@ class FaceRecognizerAuto:
         self.min_face_size = int(min_face_size)
         self.min_det_score = _clamp(_env_float("MIN_FACE_DET_SCORE", min_det_score), 0.0, 1.0)
 
+        # Optional fallback when lighting is poor.
+        # Set env FALLBACK_DET_SCORE to e.g. 0.10 for testing; 0.0 disables.
+        self._fallback_floor = _env_float("FALLBACK_DET_SCORE", 0.0)
+        self._fallback_enabled = self._fallback_floor > 0.0
+
         providers = _pick_providers(use_gpu)
         ctx_id = 0 if use_gpu else -1
 
-        self.app = FaceAnalysis(name=model_name, providers=providers)
-        self.app.prepare(ctx_id=ctx_id, det_size=det_size)
+        # Only the models enrollment reads: detector (bbox + 5-pt kps) and ArcFace, plus the
+        # 3D-68 landmark head when its pose is used. genderage / 2D-106 would otherwise run
+        # on every detected face for results nobody looks at.
+        allowed = ["detection", "recognition"]
+        if use_model_pose:
+            allowed.append("landmark_3d_68")
+        self.app, created = _get_face_analysis(model_name, providers, allowed, ctx_id, det_size)
 
         print(
             f"[FaceRecognizerAuto] USE_GPU={int(use_gpu)} ORT_PROVIDER={_env_str('ORT_PROVIDER','auto')} "
             f"providers={providers} ctx_id={ctx_id} det_size={det_size} min_det_score={self.min_det_score}"
         )
 
+        # Detection/landmarks and recognition are run separately so only the faces that pass
+        # the score/size gates are embedded, all in one batched ONNX call.
+        self._rec_model = getattr(self.app, "models", {}).get("recognition")
+        self._batched = self._rec_model is not None and hasattr(self.app, "det_model")
+
+        if created and _env_bool("AI_WARMUP", True):
+            self._warmup(det_size)
+
+    def _warmup(self, det_size: tuple[int, int]) -> None:
+        """
+        Run one dummy pass so ORT arena allocation / CUDA kernel setup happens at startup
+        instead of on the first enrollment frame. A blank frame has no faces, so the
+        recognition model is primed separately on a blank aligned crop.
+        """
+        t0 = time.perf_counter()
+        try:
+            self.app.get(np.zeros((det_size[1], det_size[0], 3), dtype=np.uint8))
+            for model in getattr(self.app, "models", {}).values():
+                if getattr(model, "taskname", "") == "recognition" and hasattr(model, "get_feat"):
+                    model.get_feat(np.zeros((112, 112, 3), dtype=np.uint8))
+        except Exception as e:
+            print(f"[FaceRecognizerAuto] warmup skipped: {e}")
+            return
+        print(f"[FaceRecognizerAuto] warmup done in {(time.perf_counter() - t0) * 1000.0:.0f} ms")
+
     def detect_and_embed(self, frame_bgr: np.ndarray) -> List[FaceDet]:
         """
         Returns FaceDet list with:
@@ -180,13 +279,71 @@ class FaceRecognizerAuto:
           - emb l2-normalized float32
           - kps either (5,2) float32 or None
         """
-        faces = self.app.get(frame_bgr)
+        passed = self._detect_passed(frame_bgr)
+
+        # batched path: one ONNX run + one row-normalize pass for all passed faces
+        embs: List[Optional[np.ndarray]] = [None] * len(passed)
+        if self._batched and passed:
+            embs = self._embed_faces(frame_bgr, [f for f, _, _ in passed])
+
+        out: List[FaceDet] = []
+        for (f, bbox, score), emb in zip(passed, embs):
+            det = self._to_face_det(f, bbox, score, emb=emb)
+            if det is not None:
+                out.append(det)
+        return out
+
+    def detect(self, frame_bgr: np.ndarray) -> List[FaceDet]:
+        """
+        Like detect_and_embed(), but skips the recognition model: emb is None
+        (call embed_one() once a face is actually going to be kept).
+        Without the batched path FaceAnalysis embeds anyway, so emb is filled in.
+        """
         out: List[FaceDet] = []
+        for f, bbox, score in self._detect_passed(frame_bgr):
+            det = self._to_face_det(f, bbox, score, need_emb=not self._batched)
+            if det is not None:
+                out.append(det)
+        return out
+
+    def align(self, frame_bgr: np.ndarray, det: FaceDet) -> Optional[np.ndarray]:
+        """The aligned crop the recognition model embeds (e.g. 112x112 BGR), or None."""
+        if self._rec_model is None or det.kps is None:
+            return None
+        size = int(self._rec_model.input_size[0])
+        return face_align.norm_crop(frame_bgr, landmark=det.kps, image_size=size)
+
+    def embed_one(
+        self, frame_bgr: np.ndarray, det: FaceDet, aligned: Optional[np.ndarray] = None
+    ) -> Optional[np.ndarray]:
+        """
+        l2-normalized embedding for a detect() result (kps in frame_bgr coords).
+        Pass `aligned` (from align()) to reuse a crop that was already made.
+        """
+        if det.emb is not None:
+            return det.emb
+        if not self._batched:
+            return None
+        if aligned is None:
+            aligned = self.align(frame_bgr, det)
+            if aligned is None:
+                return None
+        return l2_normalize(self.embed_batch([aligned])[0])
+
+    def _detect_passed(self, frame_bgr: np.ndarray) -> List[Tuple[Face, np.ndarray, float]]:
+        """Detection + score/size gates (and the optional low-light fallback)."""
+        faces = self._get_faces(frame_bgr) if self._batched else self.app.get(frame_bgr)
+        passed: List[Tuple[Face, np.ndarray, float]] = []
 
-        best_fallback: Optional[FaceDet] = None
+        # Below-threshold faces are only kept as the fallback candidate.
+        best_fallback = None
+        best_fallback_score = -1.0
 
         for f in faces:
             score = float(getattr(f, "det_score", 1.0))
+            ok = score >= self.min_det_score
+            if not ok and not (self._fallback_enabled and score > best_fallback_score):
+                continue
 
             bbox = np.asarray(getattr(f, "bbox", None), dtype=np.float32)
             if bbox is None or bbox.shape[0] != 4:
@@ -197,45 +354,81 @@ class FaceRecognizerAuto:
             if min(w, h) < self.min_face_size:
                 continue
 
+            if not ok:
+                if self._batched or getattr(f, "normed_embedding", None) is not None or getattr(f, "embedding", None) is not None:
+                    best_fallback = (f, bbox, score)
+                    best_fallback_score = score
+                continue
+
+            passed.append((f, bbox, score))
+
+        if not passed and best_fallback is not None and best_fallback_score >= self._fallback_floor:
+            passed.append(best_fallback)
+        return passed
+
+    def _get_faces(self, frame_bgr: np.ndarray) -> List[Face]:
+        """FaceAnalysis.get() minus the recognition model (embeddings are added later, batched)."""
+        bboxes, kpss = self.app.det_model.detect(frame_bgr, max_num=0, metric="default")
+        faces: List[Face] = []
+        for i in range(bboxes.shape[0]):
+            face = Face(bbox=bboxes[i, 0:4], kps=None if kpss is None else kpss[i], det_score=bboxes[i, 4])
+            for taskname, model in self.app.models.items():
+                if taskname in ("detection", "recognition"):
+                    continue
+                model.get(frame_bgr, face)
+            faces.append(face)
+        return faces
+
+    def embed_batch(self, crops: List[np.ndarray]) -> np.ndarray:
+        """Embed aligned face crops in one ONNX run -> (N, D) raw (un-normalized) float32."""
+        return np.asarray(self._rec_model.get_feat(list(crops)), dtype=np.float32)
+
+    def _embed_faces(self, frame_bgr: np.ndarray, faces: List[Face]) -> List[Optional[np.ndarray]]:
+        """l2-normalized embedding per face (None where there are no kps); also sets f.embedding."""
+        size = int(self._rec_model.input_size[0])
+        out: List[Optional[np.ndarray]] = [None] * len(faces)
+        crops: List[np.ndarray] = []
+        targets: List[int] = []
+        for i, f in enumerate(faces):
+            if getattr(f, "kps", None) is None:
+                continue
+            crops.append(face_align.norm_crop(frame_bgr, landmark=f.kps, image_size=size))
+            targets.append(i)
+        if not crops:
+            return out
+        feats = self.embed_batch(crops)
+        normed = l2_normalize_rows(feats)
+        for i, feat, emb in zip(targets, feats, normed):
+            faces[i].embedding = feat
+            out[i] = emb
+        return out
+
+    @staticmethod
+    def _to_face_det(
+        f, bbox: np.ndarray, score: float, need_emb: bool = True, emb: Optional[np.ndarray] = None
+    ) -> Optional[FaceDet]:
+        # `emb` is an already l2-normalized embedding (from _embed_faces)
+        if need_emb and emb is None:
             # Prefer normed_embedding if available (more reliable)
             emb_raw = getattr(f, "normed_embedding", None)
             if emb_raw is None:
                 emb_raw = getattr(f, "embedding", None)
             if emb_raw is None:
-                continue
-
+                return None
             emb = l2_normalize(np.asarray(emb_raw, dtype=np.float32))
 
-            kps = _to_kps5(getattr(f, "kps", None))
-            # Some InsightFace builds expose richer landmark sets; fallback to those if 5-pt is absent.
-            if kps is None:
-                for attr in ("landmark_2d_106", "landmark_2d_68", "landmark_2d_5", "landmark_3d_68"):
-                    kps = _to_kps5(getattr(f, attr, None))
-                    if kps is not None:
-                        break
-
-            det = FaceDet(bbox=bbox, emb=emb, kps=kps, det_score=score)
-
-            # main filter
-            if score >= self.min_det_score:
-                out.append(det)
-
-            # best fallback candidate
-            if best_fallback is None or score > best_fallback.det_score:
-                best_fallback = det
-
-        # Optional fallback when lighting is poor.
-        # Set env FALLBACK_DET_SCORE to e.g. 0.10 for testing.
-        fallback_floor = float(os.getenv("FALLBACK_DET_SCORE", "0.0"))  # 0.0 disables
-        if not out and best_fallback is not None and best_fallback.det_score >= fallback_floor:
-            out.append(best_fallback)
-
-        return out
-
-
-def match_gallery(emb: np.ndarray, gallery_embs: np.ndarray) -> Tuple[int, float]:
-    if gallery_embs.size == 0:
-        return -1, -1.0
-    sims = gallery_embs @ emb
-    i = int(np.argmax(sims))
-    return i, float(sims[i])
+        kps = _to_kps5(getattr(f, "kps", None))
+        # Some InsightFace builds expose richer landmark sets; fallback to those if 5-pt is absent.
+        if kps is None:
+            for attr in ("landmark_2d_106", "landmark_2d_68", "landmark_2d_5", "landmark_3d_68"):
+                kps = _to_kps5(getattr(f, attr, None))
+                if kps is not None:
+                    break
+
+        pose = getattr(f, "pose", None)
+        if pose is not None:
+            pose = np.asarray(pose, dtype=np.float32).reshape(-1)
+            if pose.shape[0] != 3 or not np.isfinite(pose).all():
+                pose = None
+
+        return FaceDet(bbox=bbox, emb=emb, kps=kps, det_score=score, pose=pose)
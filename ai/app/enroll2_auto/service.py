@@ -1,10 +1,12 @@
 # ai/app/enroll2_auto/service.py
 from __future__ import annotations
 
+import queue
 import time
 import threading
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Tuple, Any
+from typing import Dict, Optional, Tuple, Any
 
 import numpy as np
 import cv2
@@ -17,7 +19,7 @@ from ..clients.backend_client import BackendClient
 from .utils_auto import (
     now_iso,
     quality_score,
-    estimate_head_pose_deg,
+    HeadPoseTracker,
     pose_label,
 )
 
@@ -33,17 +35,63 @@ def _roi_rect(h: int, w: int, cfg: Enroll2AutoConfig) -> Tuple[int, int, int, in
     )
 
 
+# Short, Face-ID-style on-screen prompts.
+_INSTRUCTION_TEXT: Dict[str, str] = {
+    "front": "Look straight ahead",
+    "left": "Turn your head left",
+    "right": "Turn your head right",
+    "up": "Look up",
+    "down": "Look down",
+    "blink": "Blink",
+    "liveness": "Blink",
+}
+
+
+# Calm, iPhone-style voice prompts.
+_VOICE_FOR_STEP: Dict[str, str] = {
+    "front": "Keep your face in the frame. Hold still.",
+    "left": "Slowly turn your head to the left.",
+    "right": "Now slowly turn your head to the right.",
+    "up": "Now look up.",
+    "down": "Now look down.",
+}
+
+
 def _instruction_text(step: str) -> str:
-    """Short, Face-ID-style on-screen prompts."""
-    return {
-        "front": "Look straight ahead",
-        "left": "Turn your head left",
-        "right": "Turn your head right",
-        "up": "Look up",
-        "down": "Look down",
-        "blink": "Blink",
-        "liveness": "Blink",
-    }.get(step, step)
+    return _INSTRUCTION_TEXT.get(step, step)
+
+
+_POSE_ORDER = ("front", "left", "right", "up", "down")
+
+
+def _pose_bucket(
+    dy: float,
+    dp: float,
+    front: Optional[Tuple[float, float]],
+    left: float,
+    right: float,
+    up: float,
+    down: float,
+) -> Optional[str]:
+    """
+    Classify a (yaw, pitch) delta from baseline into front/left/right/up/down.
+
+    The first satisfied window in _POSE_ORDER wins. The thresholds come in as plain floats
+    (hoisted once per session by _loop), so this is scalar compares only, no per-frame
+    array or dict.
+    `front` is the (yaw, pitch) half-window, or None to never report front.
+    """
+    if front is not None and abs(dy) <= front[0] and abs(dp) <= front[1]:
+        return "front"
+    if dy <= -left:
+        return "left"
+    if dy >= right:
+        return "right"
+    if dp <= -up:
+        return "up"
+    if dp >= down:
+        return "down"
+    return None
 
 
 WELCOME_VOICE = "Let's set up face enrollment. Position your face in the frame."
@@ -61,6 +109,8 @@ class Enroll2AutoSession:
     current_step: str = "front"
     instruction: str = "Look Straight"
     collected: Dict[str, int] = field(default_factory=dict)
+    # bit i set once cfg.steps[i] has target_per_pose captures (mirrors `collected`)
+    _done_mask: int = 0
 
     last_quality: float = 0.0
     last_pose: Optional[str] = None
@@ -89,8 +139,13 @@ class Enroll2AutoSession:
     _last_pose_label: Optional[str] = None
 
     # cooldown
+    # (all interval timestamps on this session are time.monotonic() seconds)
     _cooldown_until: float = 0.0
 
+    # frame skipping: last camera frame counter seen, and new frames seen so far
+    _last_frame_id: int = -1
+    _new_frames: int = 0
+
 
     # capture throttling (FaceID-style)
     _last_capture_at: float = 0.0
@@ -126,26 +181,41 @@ class EnrollmentAutoService2:
         self.cfg = Enroll2AutoConfig()
 
         self.rec = FaceRecognizer(
-            model_name=model_name, use_gpu=True, min_face_size=min_face_size
+            model_name=model_name,
+            use_gpu=True,
+            min_face_size=min_face_size,
+            use_model_pose=bool(self.cfg.use_model_pose),
         )
 
+        # per-session zero counts, built once and copied by start() (cfg.steps never changes)
+        self._empty_counts: Dict[str, int] = dict.fromkeys(self.cfg.steps, 0)
+
         self.client = BackendClient()
         self._lock = threading.Lock()
         self._session: Optional[Enroll2AutoSession] = None
-        self._embs: Dict[str, List[np.ndarray]] = {}
+        # Immutable overlay dict, rebuilt by writers (under _lock) and swapped in as one
+        # reference assignment, so overlay_state() readers never take the lock.
+        self._overlay_snapshot: Dict[str, Any] = {"running": False}
+        # running per-pose embedding sum + count (mean is taken at save time)
+        self._emb_sum: Dict[str, np.ndarray] = {}
+        self._emb_count: Dict[str, int] = {}
+        # last accepted (unit-norm) embedding per pose, for the near-duplicate gate
+        self._emb_last: Dict[str, np.ndarray] = {}
         self._run = False
-        self._thread: Optional[threading.Thread] = None
+        # grabber -> inference handoff; maxsize=1 so a slow inference step only ever sees the newest frame
+        self._frames: "queue.Queue[Tuple[np.ndarray, int]]" = queue.Queue(maxsize=1)
+        self._grab_thread: Optional[threading.Thread] = None
+        # set by stop() (and by a restart) so the worker threads' waits return at once
+        self._stop_event = threading.Event()
+        self._infer_thread: Optional[threading.Thread] = None
+        # (frame shape, roi, min_w, max_w) for the last frame size; only _loop touches it
+        self._roi_geom: Optional[Tuple[Tuple[int, int], Tuple[int, int, int, int], float, float]] = None
+        # backend upload runs here so the inference thread never blocks on HTTP
+        self._save_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="enroll2-save")
 
 
     def _voice_for_step(self, step: str) -> str:
-        # Calm, iPhone-style voice prompts.
-        return {
-            "front": "Keep your face in the frame. Hold still.",
-            "left": "Slowly turn your head to the left.",
-            "right": "Now slowly turn your head to the right.",
-            "up": "Now look up.",
-            "down": "Now look down.",
-        }.get(step, "Please follow the on-screen instruction.")
+        return _VOICE_FOR_STEP.get(step, "Please follow the on-screen instruction.")
 
     def _say_instruction_for_step(self, step: str, *, force: bool = False) -> None:
         """
@@ -169,7 +239,7 @@ class EnrollmentAutoService2:
             s = self._session
             if not s:
                 return
-            now = time.time()
+            now = time.monotonic()
             min_gap = float(getattr(self.cfg, "voice_min_interval_sec", 1.4))
 
             if not force:
@@ -185,6 +255,7 @@ class EnrollmentAutoService2:
             s._voice_last_text = text
             s._voice_last_at = now
             s.last_update_at = now_iso()
+            self._publish_overlay_locked()
 
     def start(
         self,
@@ -198,7 +269,7 @@ class EnrollmentAutoService2:
         self.client.upsert_employee(name, employee_id)
 
         with self._lock:
-            sid = f"enroll2_{int(time.time())}"
+            sid = f"enroll2_{time.time_ns()}"
             self._session = Enroll2AutoSession(
                 session_id=sid,
                 employee_id=employee_id,
@@ -208,13 +279,22 @@ class EnrollmentAutoService2:
                 status="running",
                 current_step=self.cfg.steps[0],
                 instruction=_instruction_text(self.cfg.steps[0]),
-                collected={s: 0 for s in self.cfg.steps},
+                collected=self._empty_counts.copy(),
             )
-            self._embs = {s: [] for s in self.cfg.steps}
+            self._emb_sum = {}
+            self._emb_count = self._empty_counts.copy()
+            self._emb_last = {}
+            self._roi_geom = None
             self._run = True
+            self._stop_event.set()  # retire the previous session's threads promptly
+            self._stop_event = threading.Event()
+            self._frames = queue.Queue(maxsize=1)
+            self._publish_overlay_locked()
 
-        self._thread = threading.Thread(target=self._loop, daemon=True)
-        self._thread.start()
+        self._grab_thread = threading.Thread(target=self._grab_loop, args=(camera_id,), daemon=True)
+        self._infer_thread = threading.Thread(target=self._loop, daemon=True)
+        self._grab_thread.start()
+        self._infer_thread.start()
 
         # initial instruction voice
         self._say(WELCOME_VOICE, force=True)
@@ -230,48 +310,97 @@ class EnrollmentAutoService2:
             self._session.last_message = "Stopped"
             self._session.last_update_at = now_iso()
             self._run = False
+            self._stop_event.set()
+            self._publish_overlay_locked()
             return True
 
     def status(self) -> Optional[Enroll2AutoSession]:
-        with self._lock:
-            return self._session
+        # Lock-free: one attribute read; start() swaps in a new session object wholesale.
+        return self._session
 
     def overlay_state(self) -> Dict[str, Any]:
-        with self._lock:
-            s = self._session
-            if not s:
-                return {"running": False}
-            return {
-                "running": s.status == "running",
-                "status": s.status,
-                "employee_id": s.employee_id,
-                "name": s.name,
-                "camera_id": s.camera_id,
-                "step": s.current_step,
-                "instruction": s.instruction,
-                "collected": dict(s.collected),
-                "last_quality": s.last_quality,
-                "last_pose": s.last_pose,
-                "last_message": s.last_message,
-                "last_update_at": s.last_update_at,
-                "overlay_primary_bbox": s.overlay_primary_bbox,
-                "overlay_roi_faces": s.overlay_roi_faces,
-                "overlay_multi_in_roi": s.overlay_multi_in_roi,
-                # aliases for legacy overlay consumers
-                "bbox": s.overlay_primary_bbox,
-                "quality": s.last_quality,
-                "pose": s.last_pose,
-                "message": s.last_message,
-                "roi_faces": s.overlay_roi_faces,
-                "voice_seq": int(getattr(s, "voice_seq", 0)),
-                "voice_text": str(getattr(s, "voice_text", "")),
-                "target_per_pose": int(getattr(self.cfg, "target_per_pose", 5)),
-                "baseline_yaw": s._baseline_yaw,
-                "baseline_pitch": s._baseline_pitch,
-            }
+        # Lock-free: the snapshot is replaced wholesale, never mutated in place.
+        return self._overlay_snapshot
+
+    def _publish_overlay_locked(self) -> None:
+        """Rebuild the overlay snapshot from the session. Caller holds self._lock."""
+        s = self._session
+        if not s:
+            self._overlay_snapshot = {"running": False}
+            return
+        self._overlay_snapshot = {
+            "running": s.status == "running",
+            "status": s.status,
+            "employee_id": s.employee_id,
+            "name": s.name,
+            "camera_id": s.camera_id,
+            "step": s.current_step,
+            "instruction": s.instruction,
+            "collected": dict(s.collected),
+            "last_quality": s.last_quality,
+            "last_pose": s.last_pose,
+            "last_message": s.last_message,
+            "last_update_at": s.last_update_at,
+            "overlay_primary_bbox": s.overlay_primary_bbox,
+            "overlay_roi_faces": s.overlay_roi_faces,
+            "overlay_multi_in_roi": s.overlay_multi_in_roi,
+            # aliases for legacy overlay consumers
+            "bbox": s.overlay_primary_bbox,
+            "quality": s.last_quality,
+            "pose": s.last_pose,
+            "message": s.last_message,
+            "roi_faces": s.overlay_roi_faces,
+            "voice_seq": int(getattr(s, "voice_seq", 0)),
+            "voice_text": str(getattr(s, "voice_text", "")),
+            "target_per_pose": int(getattr(self.cfg, "target_per_pose", 5)),
+            "baseline_yaw": s._baseline_yaw,
+            "baseline_pitch": s._baseline_pitch,
+        }
+
+    def _running(self) -> bool:
+        # Polled by both worker threads every iteration; plain reads, so no lock
+        # (a stale answer only delays the exit by one iteration).
+        s = self._session
+        return bool(self._run and s is not None and s.status == "running")
+
+    def _grab_loop(self, cam_id: str):
+        """
+        Producer: hand each new camera frame to the inference thread.
+        If inference hasn't taken the previous frame yet, it is replaced (latest wins).
+        """
+        frames = self._frames
+        stop_ev = self._stop_event
+        last_fid = -1
+        poll = 0.01
+        # a restarted session gets a new queue; that also retires this thread
+        while self._running() and self._frames is frames:
+            # probe the counter first so unchanged frames are never copied
+            if self.camera_rt.frame_seq(cam_id) == last_fid:
+                stop_ev.wait(poll)
+                continue
+
+            # enrollment never draws on the frame, so the grabber's frame is used as-is
+            frame_bgr, fid = self.camera_rt.get_frame_with_seq(cam_id, copy=False)
+            if frame_bgr is None:
+                self._msg("Waiting for camera…")
+                stop_ev.wait(0.1)
+                continue
+            last_fid = fid
+
+            try:
+                frames.put_nowait((frame_bgr, fid))
+            except queue.Full:
+                try:
+                    frames.get_nowait()
+                except queue.Empty:
+                    pass
+                try:
+                    frames.put_nowait((frame_bgr, fid))
+                except queue.Full:
+                    pass
 
     def _loop(self):
-        """Face-ID style auto-capture.
+        """Face-ID style auto-capture (consumer side; frames come from _grab_loop).
 
         - As soon as ONE face is inside the ROI, we start capturing embeddings.
         - We DO NOT require long 'hold still' timers that can feel like a hang.
@@ -280,11 +409,23 @@ class EnrollmentAutoService2:
         """
 
         period = 1.0 / max(1.0, float(getattr(self.cfg, "ai_fps", 6.0)))
+        # slower pace while nobody is (alone) in the ROI; never faster than `period`
+        idle_period = max(period, 1.0 / max(0.5, float(getattr(self.cfg, "ai_fps_idle", 4.0))))
+        detect_every = max(1, int(getattr(self.cfg, "detect_every_n_frames", 1)))
+        frames = self._frames
+        # every pause below wakes immediately on stop()
+        stop_ev = self._stop_event
 
         target_per_pose = int(getattr(self.cfg, "target_per_pose", 5))
         max_per_pose = int(getattr(self.cfg, "max_per_pose", 10))
 
         min_q = float(getattr(self.cfg, "min_quality_score", 45.0))
+        q_max_side = int(getattr(self.cfg, "quality_max_side", 0))
+        min_det = float(getattr(self.cfg, "quality_min_det_score", 0.0))
+        q_aligned = bool(getattr(self.cfg, "quality_on_aligned_crop", False))
+
+        # captures whose cosine to the previous one for the same pose exceeds this are dropped
+        dedup_sim = float(getattr(self.cfg, "dedup_cos_sim", 0.0))
 
         # how often to accept a capture (seconds)
         capture_interval = float(getattr(self.cfg, "capture_interval_sec", 0.25))
@@ -305,73 +446,120 @@ class EnrollmentAutoService2:
         tol = float(getattr(self.cfg, "delta_tolerance_deg", 12.0))
         allow_unknown_front = bool(getattr(self.cfg, "allow_unknown_pose_front", True))
         flip_yaw = bool(getattr(self.cfg, "flip_yaw", False))
+        model_pose = bool(getattr(self.cfg, "use_model_pose", False))
+
+        # bbox-center jump (px) between processed frames above which pose is not estimated
+        motion_px = 2.0 * float(getattr(self.cfg, "stable_px", 30.0))
+
+        # skips solvePnP while the landmarks are still, warm-starts it otherwise
+        head_pose = HeadPoseTracker(still_px=1.0)
+
+        # derived per-session thresholds (constant for the whole loop)
+        steps = tuple(self.cfg.steps)
+        front_y_narrow = min(fa_y, fb_y)
+        front_p_narrow = min(fa_p, fb_p)
+        left_min = max(0.0, dy_left - tol)
+        right_min = max(0.0, dy_right - tol)
+        up_min = max(0.0, dp_up - tol)
+        down_min = max(0.0, dp_down - tol)
+
+        step_bit = {st: 1 << i for i, st in enumerate(steps)}
+        all_done = (1 << len(steps)) - 1
+
+        def next_required_step(done_mask: int) -> Optional[str]:
+            # first step (in cfg order) whose bit is still clear
+            free = ~done_mask & all_done
+            if not free:
+                return None
+            return steps[(free & -free).bit_length() - 1]
+
+        while self._running() and self._frames is frames:
+            try:
+                frame_bgr, fid = frames.get(timeout=max(period, 0.1))
+            except queue.Empty:
+                continue
 
-        def next_required_step(collected: Dict[str, int]) -> Optional[str]:
-            for s in self.cfg.steps:
-                if int(collected.get(s, 0) or 0) < target_per_pose:
-                    return s
-            return None
-
-        def set_current_step(step: str):
-            # Keep UI + voice aligned to the next missing capture.
-            speak = False
-            with self._lock:
-                if not self._session:
-                    return
-                if self._session.current_step != step:
-                    self._session.current_step = step
-                    self._session.instruction = _instruction_text(step)
-                    self._session.last_update_at = now_iso()
-                    speak = True
-            if speak:
-                # Trigger voice after releasing the lock to avoid self-deadlock.
-                self._say_instruction_for_step(step)
-
-        while True:
+            # Detect on every Nth new frame only; the overlay keeps showing the last
+            # detection meanwhile.
             with self._lock:
-                if not self._run or not self._session or self._session.status != "running":
+                s = self._session
+                if not s:
                     break
-                cam_id = self._session.camera_id
-
-            frame_bgr = self.camera_rt.get_frame(camera_id=cam_id)
-            if frame_bgr is None:
-                self._msg("Waiting for camera…")
-                time.sleep(period)
+                if fid == s._last_frame_id:
+                    continue
+                s._last_frame_id = fid
+                s._new_frames += 1
+                skip = ((s._new_frames - 1) % detect_every) != 0
+            if skip:
                 continue
 
             primary, roi_faces, multi_in_roi = self._select_primary(frame_bgr)
 
+            # One critical section for the detection outcome: overlay box, motion tracking
+            # and the capture-throttle read (HTTP readers only ever see the finished state).
             with self._lock:
-                if self._session:
-                    self._session.overlay_roi_faces = roi_faces
-                    self._session.overlay_multi_in_roi = multi_in_roi
-                    self._session.overlay_primary_bbox = (
-                        tuple(map(int, primary.bbox)) if primary is not None else None
+                s = self._session
+                if not s:
+                    break
+                s.overlay_roi_faces = roi_faces
+                s.overlay_multi_in_roi = multi_in_roi
+                s.overlay_primary_bbox = (
+                    tuple(primary.bbox.astype(np.int32).tolist()) if primary is not None else None
+                )
+                moving = False
+                throttle_left = 0.0
+                if primary is None:
+                    s.last_message = (
+                        "Only one face in the box" if multi_in_roi else "Position your face in the box"
                     )
+                else:
+                    # track the box on every processed frame so the jump is frame-to-frame
+                    moving = not self._bbox_motion_small_locked(s, primary.bbox, motion_px)
+                    # Inside the capture interval nothing can be captured: skip quality + pose
+                    # work (the tiles keep showing the values from the last scored frame).
+                    throttle_left = capture_interval - (time.monotonic() - s._last_capture_at)
+                    if throttle_left > 0.0 or moving:
+                        s.last_message = "Hold steady…"
+                s.last_update_at = now_iso()
+                self._publish_overlay_locked()
 
             # Need exactly ONE face inside ROI
             if primary is None:
                 if multi_in_roi:
-                    self._msg("Only one face in the box")
                     self._say("Please make sure only one face is inside the frame.")
                 else:
-                    self._msg("Position your face in the box")
                     self._say("Position your face in the frame.")
-                time.sleep(period)
+                stop_ev.wait(idle_period)
+                continue
+
+            # Throttled, or fast motion (blurred crop, stale landmarks): skip the
+            # quality/solvePnP work until a capture is possible again.
+            if throttle_left > 0.0 or moving:
+                # when throttled, sleep until the next capture is allowed
+                stop_ev.wait(max(period, throttle_left))
                 continue
 
-            # Quality gate (soft + friendly)
-            q = float(quality_score(primary.bbox, frame_bgr))
+            # Quality gate (soft + friendly); the detector score is a free first cut
+            if primary.det_score < min_det:
+                self._update(q=None, pose=None, msg="Hold still, improve lighting", pose_deg=None)
+                self._say("Hold still. Improve lighting if needed.")
+                stop_ev.wait(period)
+                continue
+            aimg = self.rec.align(frame_bgr, primary) if q_aligned else None
+            q = float(quality_score(primary.bbox, frame_bgr, max_side=q_max_side, aligned_crop=aimg))
             if q < min_q:
                 self._update(q=q, pose=None, msg="Hold still, improve lighting", pose_deg=None)
                 self._say("Hold still. Improve lighting if needed.")
-                time.sleep(period)
+                stop_ev.wait(period)
                 continue
 
             # Pose
             pose_deg = None
-            if primary.kps is not None:
-                pose_deg = estimate_head_pose_deg(primary.kps, frame_bgr.shape)
+            if model_pose and primary.pose is not None:
+                p_pitch, p_yaw, p_roll = (float(v) for v in primary.pose)
+                pose_deg = (p_yaw, p_pitch, p_roll)
+            elif primary.kps is not None:
+                pose_deg = head_pose.estimate(primary.kps, frame_bgr.shape)
 
             if pose_deg is None:
                 yaw = pitch = roll = 0.0
@@ -381,9 +569,11 @@ class EnrollmentAutoService2:
             if flip_yaw:
                 yaw = -yaw
 
-            # Baseline (first good front)
             with self._lock:
-                if self._session and self._session._baseline_yaw is None:
+                if not self._session:
+                    break
+                # Baseline (first good front)
+                if self._session._baseline_yaw is None:
                     # Only set baseline when we have a stable-ish front (or when pose is missing but allowed)
                     if pose_deg is not None and (abs(yaw) <= fa_y and abs(pitch) <= fa_p):
                         self._session._baseline_yaw = float(yaw)
@@ -392,26 +582,15 @@ class EnrollmentAutoService2:
                         self._session._baseline_yaw = 0.0
                         self._session._baseline_pitch = 0.0
 
-            with self._lock:
-                if not self._session:
-                    break
                 base_y = float(self._session._baseline_yaw or 0.0)
                 base_p = float(self._session._baseline_pitch or 0.0)
-                collected = dict(self._session.collected or {})
+                done_mask = self._session._done_mask
 
             dy = yaw - base_y
             dp = pitch - base_p
 
-            # UI pose label (for debug tiles)
-            ui_pose = "front"
-            if dy <= -(dy_left):
-                ui_pose = "left"
-            elif dy >= (dy_right):
-                ui_pose = "right"
-            elif dp <= -(dp_up):
-                ui_pose = "up"
-            elif dp >= (dp_down):
-                ui_pose = "down"
+            # UI pose label (for debug tiles): full turn thresholds, front otherwise
+            ui_pose = _pose_bucket(dy, dp, None, dy_left, dy_right, dp_up, dp_down) or "front"
 
             # Capture bucket (stricter than UI label)
             bucket: Optional[str] = None
@@ -419,112 +598,174 @@ class EnrollmentAutoService2:
                 if allow_unknown_front:
                     bucket = "front"
             else:
-                need_front = int(collected.get("front", 0) or 0) < target_per_pose
-                front_y = fa_y if need_front else min(fa_y, fb_y)
-                front_p = fa_p if need_front else min(fa_p, fb_p)
-
-                if abs(dy) <= front_y and abs(dp) <= front_p:
-                    bucket = "front"
-                elif dy <= -max(0.0, dy_left - tol):
-                    bucket = "left"
-                elif dy >= max(0.0, dy_right - tol):
-                    bucket = "right"
-                elif dp <= -max(0.0, dp_up - tol):
-                    bucket = "up"
-                elif dp >= max(0.0, dp_down - tol):
-                    bucket = "down"
+                need_front = not (done_mask & step_bit.get("front", 0))
+                front_win = (fa_y, fa_p) if need_front else (front_y_narrow, front_p_narrow)
+                bucket = _pose_bucket(dy, dp, front_win, left_min, right_min, up_min, down_min)
 
             # Guide user to the next missing step (FaceID feel)
-            nxt = next_required_step(collected)
-            if nxt is not None:
-                set_current_step(nxt)
-
-            # Update status (no noisy ms counters)
-            self._update(q=q, pose=ui_pose, msg="", pose_deg=pose_deg)
-
-            # If we don't have a valid bucket yet, keep guiding (no hang)
-            if bucket is None or nxt is None:
-                self._msg("Move your head slowly")
-                if nxt is not None:
-                    self._say_instruction_for_step(nxt)
-                time.sleep(period)
+            nxt = next_required_step(done_mask)
+            guiding = bucket is None or nxt is None
+            if guiding:
+                # no valid bucket yet: keep guiding (no hang)
+                msg = "Move your head slowly"
+            elif done_mask & step_bit.get(bucket, 0):
+                # this bucket is already complete: keep guiding to next
+                msg = "Good. Keep going…"
+            else:
+                msg = ""
+
+            # Step change + status tiles in one critical section (no noisy ms counters)
+            step_changed = False
+            with self._lock:
+                if not self._session or self._session.status != "running":
+                    break
+                if nxt is not None and self._session.current_step != nxt:
+                    self._session.current_step = nxt
+                    self._session.instruction = _instruction_text(nxt)
+                    step_changed = True
+                self._session.last_quality = q
+                self._session.last_pose = ui_pose
+                if msg:
+                    self._session.last_message = msg
+                self._session.last_update_at = now_iso()
+                self._publish_overlay_locked()
+                got = self._emb_count.get(bucket, 0) if bucket is not None else 0
+
+            # Keep UI + voice aligned to the next missing capture (voice after the lock is released).
+            if nxt is not None and (step_changed or guiding):
+                self._say_instruction_for_step(nxt)
+
+            if msg:
+                stop_ev.wait(period)
                 continue
 
-            # If this bucket is already complete, keep guiding to next
-            if int(collected.get(bucket, 0) or 0) >= target_per_pose:
-                self._msg("Good. Keep going…")
-                time.sleep(period)
+            # Only frames that are actually captured pay for the recognition model.
+            emb = self.rec.embed_one(frame_bgr, primary, aligned=aimg) if got < max_per_pose else None
+            if emb is None and got < max_per_pose:
+                self._msg("Hold steady…")
+                stop_ev.wait(period)
                 continue
 
-            # Throttle capture rate (prevents duplicates + stabilizes)
-            now = time.time()
+            # Near-duplicate of the previous capture for this pose: adds nothing to the mean.
+            if emb is not None and dedup_sim > 0.0:
+                last = self._emb_last.get(bucket)
+                if last is not None and float(emb @ last) > dedup_sim:
+                    # Throttle like an accepted capture so holding still doesn't re-embed
+                    # on every inference frame.
+                    with self._lock:
+                        if self._session is not None:
+                            self._session._last_capture_at = time.monotonic()
+                    self._msg("Good. Move slightly…")
+                    stop_ev.wait(period)
+                    continue
+                self._emb_last[bucket] = emb
+
             with self._lock:
                 if not self._session or self._session.status != "running":
                     break
-                last_cap = float(getattr(self._session, "_last_capture_at", 0.0) or 0.0)
-                if (now - last_cap) < capture_interval:
-                    self._session.last_quality = q
-                    self._session.last_pose = ui_pose
-                    self._session.last_message = "Hold steady…"
-                    self._session.last_update_at = now_iso()
-                    time.sleep(period)
-                    continue
-
                 # store embedding
-                if len(self._embs[bucket]) < max_per_pose:
-                    self._embs[bucket].append(primary.emb)
+                if emb is not None:
+                    acc = self._emb_sum.get(bucket)
+                    if acc is None:
+                        acc = self._emb_sum[bucket] = np.zeros(emb.shape, dtype=np.float32)
+                    acc += np.asarray(emb, dtype=np.float32)
+                    got += 1
+                    self._emb_count[bucket] = got
 
-                got = len(self._embs[bucket])
                 self._session.collected[bucket] = got
-                self._session.last_quality = q
-                self._session.last_pose = ui_pose
+                if got >= target_per_pose:
+                    self._session._done_mask |= step_bit.get(bucket, 0)
                 self._session.last_message = f"Captured ✓ ({got}/{target_per_pose})"
                 self._session.last_update_at = now_iso()
 
                 # record capture time
-                self._session._last_capture_at = now
+                self._session._last_capture_at = time.monotonic()
                 self._session._last_capture_pose = bucket
+                self._publish_overlay_locked()
 
-            # Finished?
-            with self._lock:
-                if not self._session:
-                    break
-                done = all(int(self._session.collected.get(s, 0) or 0) >= target_per_pose for s in self.cfg.steps)
+                # Finished?
+                done = self._session._done_mask == all_done
 
             if done:
                 self._auto_save()
                 break
 
-            time.sleep(period)
+            stop_ev.wait(period)
+
+    def _roi_geometry(self, h: int, w: int) -> Tuple[Tuple[int, int, int, int], float, float]:
+        """ROI rect + face-width limits for this frame size (recomputed only when it changes)."""
+        g = self._roi_geom
+        if g is None or g[0] != (h, w):
+            g = self._roi_geom = (
+                (h, w),
+                _roi_rect(h, w, self.cfg),
+                self.cfg.min_face_w_frac * w,
+                self.cfg.max_face_w_frac * w,
+            )
+        return g[1], g[2], g[3]
+
     def _select_primary(self, frame_bgr):
         h, w = frame_bgr.shape[:2]
-        roi = _roi_rect(h, w, self.cfg)
-        min_w = self.cfg.min_face_w_frac * w
-        max_w = self.cfg.max_face_w_frac * w
+        roi, min_w, max_w = self._roi_geometry(h, w)
 
-        dets = self.rec.detect_and_embed(frame_bgr)
+        x0, y0, x1, y1 = roi
+        if getattr(self.cfg, "detect_roi_only", False):
+            dets = self._detect_in_roi(frame_bgr, roi)
+        else:
+            dets = self.rec.detect(frame_bgr)
         if not dets:
             return None, 0, False
 
-        x0, y0, x1, y1 = roi
-        in_roi = []
-        for d in dets:
-            bx0, by0, bx1, by1 = d.bbox.astype(int).tolist()
-            cx = (bx0 + bx1) * 0.5
-            cy = (by0 + by1) * 0.5
-            bw = (bx1 - bx0)
-
-            if not (x0 <= cx <= x1 and y0 <= cy <= y1):
-                continue
-            if bw < min_w or bw > max_w:
-                continue
-            in_roi.append(d)
+        # one vectorized pass over all boxes (int-truncated, as the per-box version did)
+        boxes = np.array([d.bbox for d in dets], dtype=np.int64)
+        # centers kept doubled (x0+x1, not (x0+x1)/2) so the ROI test stays in integers
+        cx2 = boxes[:, 0] + boxes[:, 2]
+        cy2 = boxes[:, 1] + boxes[:, 3]
+        bw = boxes[:, 2] - boxes[:, 0]
+        mask = (
+            (cx2 >= 2 * x0) & (cx2 <= 2 * x1) & (cy2 >= 2 * y0) & (cy2 <= 2 * y1)
+            & (bw >= min_w) & (bw <= max_w)
+        )
+        idxs = np.flatnonzero(mask)
 
-        if not in_roi:
+        if idxs.size == 0:
             return None, 0, False
-        if len(in_roi) > 1:
-            return None, len(in_roi), True
-        return in_roi[0], len(in_roi), False
+        if idxs.size > 1:
+            return None, int(idxs.size), True
+        return dets[int(idxs[0])], 1, False
+
+    def _detect_in_roi(self, frame_bgr: np.ndarray, roi: Tuple[int, int, int, int]):
+        """detect() on a padded ROI crop (fewer pixels to the detector), mapped back to frame coords."""
+        h, w = frame_bgr.shape[:2]
+        x0, y0, x1, y1 = roi
+        pad = float(getattr(self.cfg, "detect_roi_pad_frac", 0.0))
+        px = int((x1 - x0) * pad)
+        py = int((y1 - y0) * pad)
+        cx0, cy0 = max(0, x0 - px), max(0, y0 - py)
+        cx1, cy1 = min(w, x1 + px), min(h, y1 + py)
+        if cx1 <= cx0 or cy1 <= cy0:
+            return []
+
+        dets = self.rec.detect(frame_bgr[cy0:cy1, cx0:cx1])
+        if cx0 or cy0:
+            off = np.array([cx0, cy0], dtype=np.float32)
+            for d in dets:
+                d.bbox = d.bbox + np.tile(off, 2)
+                if d.kps is not None:
+                    d.kps = d.kps + off
+        return dets
+
+    @staticmethod
+    def _bbox_motion_small_locked(s: Enroll2AutoSession, bbox: np.ndarray, max_px: float) -> bool:
+        """True unless the box center jumped more than max_px since the previous call. Caller holds self._lock."""
+        cx = float(bbox[0] + bbox[2]) * 0.5
+        cy = float(bbox[1] + bbox[3]) * 0.5
+        last = s._last_center
+        s._last_center = (cx, cy)
+        if last is None:
+            return True
+        return (cx - last[0]) ** 2 + (cy - last[1]) ** 2 <= max_px * max_px
+
     def _stable(self, bbox: np.ndarray) -> bool:
         # Legacy method kept for compatibility; FaceID-style capture does not require it.
         return True
@@ -536,30 +777,46 @@ class EnrollmentAutoService2:
                 return
             employee_id = s.employee_id
 
-            embeddings: Dict[str, np.ndarray] = {}
-            for step, vecs in self._embs.items():
-                if not vecs:
-                    continue
-                arr = np.stack(vecs, axis=0)
-                mean = arr.mean(axis=0)
-                n = float(np.linalg.norm(mean) + 1e-12)
-                mean = mean / n
-                embeddings[step] = mean.astype(np.float32)
+            # Only the (few) per-pose sums are handed out; the math runs outside the lock.
+            sums = [(step, acc) for step, acc in self._emb_sum.items() if self._emb_count.get(step, 0) > 0]
 
+            s.status = "saving"
+            s.last_message = "Saving enrollment…"
+            s.last_update_at = now_iso()
+            self._publish_overlay_locked()
+
+        # Captured embeddings are already unit-norm (FaceRecognizerAuto.embed_one), and the
+        # mean points the same way as the sum, so the sum is normalized directly.
+        embeddings: Dict[str, np.ndarray] = {}
+        if sums:
+            # all poses at once: one (A, D) matrix, one row-norm pass, one in-place divide
+            means = np.stack([acc for _, acc in sums]).astype(np.float32, copy=False)
+            norms = np.sqrt(np.einsum("ad,ad->a", means, means)) + np.float32(1e-12)
+            means /= norms[:, None]
+            embeddings = {step: means[i] for i, (step, _) in enumerate(sums)}
+
+        self._save_executor.submit(self._save_blocking, s, employee_id, embeddings)
+
+    def _save_blocking(self, s: Enroll2AutoSession, employee_id: str, embeddings: Dict[str, np.ndarray]):
+        """Backend upload + final status (runs on the save executor)."""
         try:
             self.client.save_employee_embeddings(employee_id, embeddings)
             with self._lock:
-                if self._session:
-                    self._session.status = "saved"
-                    self._session.last_message = "Enrollment saved ✅"
-                    self._session.last_update_at = now_iso()
+                # a newer session may have started meanwhile; only finish our own
+                if self._session is s:
+                    s.status = "saved"
+                    s.last_message = "Enrollment saved ✅"
+                    s.last_update_at = now_iso()
+                    self._publish_overlay_locked()
         except Exception as e:
             with self._lock:
-                if self._session:
-                    self._session.status = "error"
-                    self._session.error = str(e)
-                    self._session.last_message = "Save failed"
-                    self._session.last_update_at = now_iso()
+                if self._session is s:
+                    s.status = "error"
+                    s.error = str(e)
+                    s.last_message = "Save failed"
+                    s.last_update_at = now_iso()
+                    self._publish_overlay_locked()
+
     def _msg(self, msg: str):
         # Update message only (do not reset quality/pose tiles in UI)
         with self._lock:
@@ -567,10 +824,11 @@ class EnrollmentAutoService2:
                 return
             self._session.last_message = msg
             self._session.last_update_at = now_iso()
+            self._publish_overlay_locked()
 
     def _update(
         self,
-        q: float,
+        q: Optional[float],
         pose: Optional[str],
         msg: str,
         pose_deg: Optional[Tuple[float, float, float]],
@@ -578,8 +836,10 @@ class EnrollmentAutoService2:
         with self._lock:
             if not self._session:
                 return
-            self._session.last_quality = float(q)
+            if q is not None:  # None = not scored this frame, keep the last value
+                self._session.last_quality = float(q)
             self._session.last_pose = pose
             if msg:
                 self._session.last_message = msg
             self._session.last_update_at = now_iso()
+            self._publish_overlay_locked()
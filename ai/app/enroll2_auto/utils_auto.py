@@ -2,17 +2,29 @@ from __future__ import annotations
 import os
 import time
 from datetime import datetime
-from typing import Optional, Tuple, Any, Dict
+from typing import Optional, Tuple, Dict
 
 import numpy as np
 import cv2
 
+from ..utils import HAVE_NUMBA, njit_if_available, _DIST_COEFFS, _MODEL_POINTS_3D, _camera_matrix
+
 
 # -----------------------------
 # Basics
 # -----------------------------
+# (epoch second, formatted) of the last now_iso() call; replaced as one tuple so it is thread-safe
+_iso_cache: Tuple[int, str] = (-1, "")
+
+
 def now_iso() -> str:
-    return datetime.now().isoformat(timespec="seconds")
+    # Second resolution, so the string only needs formatting once per second.
+    global _iso_cache
+    sec = int(time.time())
+    cached = _iso_cache
+    if cached[0] != sec:
+        cached = _iso_cache = (sec, datetime.fromtimestamp(sec).isoformat(timespec="seconds"))
+    return cached[1]
 
 
 def ensure_dir(path: str) -> None:
@@ -41,7 +53,7 @@ def _clip01(x: float) -> float:
     return float(max(0.0, min(1.0, x)))
 
 
-def quality_score(face_bbox, frame_bgr) -> float:
+def quality_score(face_bbox, frame_bgr, max_side: int = 0, aligned_crop=None) -> float:
     """
     Production-friendly quality metric (0..100).
     Combines:
@@ -51,13 +63,21 @@ def quality_score(face_bbox, frame_bgr) -> float:
       - face size ratio (CCTV: reject small/far faces)
 
     NOTE: this returns 0..100 (same scale as your original utils).
+
+    max_side > 0 area-downsamples the face crop so its longer side is at most max_side
+    (by an integer factor) before the pixel statistics; only the crop is ever read, so the
+    whole frame is not resized.
+    Sharpness is scale-dependent, so re-check min_quality_score when enabling it.
+
+    aligned_crop (e.g. the 112x112 ArcFace crop) replaces the bbox crop for the pixel
+    statistics; face_bbox still drives the size term. Also scale-dependent, as above.
     """
     x1, y1, x2, y2 = [int(v) for v in face_bbox]
     h, w = frame_bgr.shape[:2]
     x1, y1 = max(0, x1), max(0, y1)
     x2, y2 = min(w - 1, x2), min(h - 1, y2)
-    crop = frame_bgr[y1:y2, x1:x2]
-    if crop.size == 0:
+    crop = frame_bgr[y1:y2, x1:x2] if aligned_crop is None else aligned_crop
+    if crop.size == 0 or x2 <= x1 or y2 <= y1:
         return 0.0
 
     # face size ratio
@@ -67,14 +87,28 @@ def quality_score(face_bbox, frame_bgr) -> float:
 
     gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
 
-    # sharpness (laplacian variance)
-    lap_var = float(cv2.Laplacian(gray, cv2.CV_64F).var())
+    if max_side > 0:
+        # integer factor so INTER_AREA takes its fast block-average path
+        ch, cw = gray.shape[:2]
+        k = -(-max(ch, cw) // int(max_side))
+        if k > 1 and ch >= k and cw >= k:
+            gray = cv2.resize(
+                gray[: (ch // k) * k, : (cw // k) * k],
+                (cw // k, ch // k),
+                interpolation=cv2.INTER_AREA,
+            )
+
+    # sharpness (laplacian variance); meanStdDev gets it in one native pass.
+    # CV_32F is exact here (8-bit input, |lap| <= 2040) at half the bandwidth of CV_64F.
+    _lap_mean, lap_std = cv2.meanStdDev(cv2.Laplacian(gray, cv2.CV_32F))
+    lap_var = float(lap_std[0, 0]) ** 2
     # normalize: 0..1 (tuned for CCTV; adjust if needed)
     sharp = _clip01(lap_var / 350.0)  # 300-500 is usually “sharp enough”
 
-    # brightness and contrast
-    mean = float(np.mean(gray))
-    std = float(np.std(gray))
+    # brightness and contrast (single pass over the crop)
+    g_mean, g_std = cv2.meanStdDev(gray)
+    mean = float(g_mean[0, 0])
+    std = float(g_std[0, 0])
 
     # brightness score peaks around ~110..160 for 8-bit
     # penalize too dark / too bright
@@ -98,99 +132,127 @@ def quality_score(face_bbox, frame_bgr) -> float:
 # -----------------------------
 # Head pose (yaw, pitch, roll)
 # -----------------------------
-def estimate_head_pose_deg(
-    kps: np.ndarray,
-    frame_shape: Tuple[int, int, int],
-) -> Optional[Tuple[float, float, float]]:
-    """
-    Robust head-pose estimate: returns (yaw, pitch, roll) in degrees.
+# _MODEL_POINTS_3D/_DIST_COEFFS/_camera_matrix are shared with ..utils.estimate_head_pose_deg
 
-    Uses:
-      - solvePnP (ITERATIVE) on 5 landmarks
-      - cv2.decomposeProjectionMatrix to get stable Euler angles
 
-    kps expected shape (5,2) image coords:
-      [left_eye, right_eye, nose, left_mouth, right_mouth]
-    """
-    if kps is None:
-        return None
-    kps = np.asarray(kps)
-    if kps.shape != (5, 2):
+def _pose_fallback_from_kps5_np(points: np.ndarray) -> Optional[Tuple[float, float, float]]:
+    # Geometry-only fallback when solvePnP is unstable/unavailable.
+    # Produces a bounded, monotonic signal good enough for enrollment gating.
+    try:
+        le, re, nose, lm, rm = points.astype(np.float32)
+
+        eye_dist = float(np.linalg.norm(re - le))
+        if not np.isfinite(eye_dist) or eye_dist < 1.0:
+            return None
+
+        mid_eye = (le + re) * 0.5
+        mid_mouth = (lm + rm) * 0.5
+
+        # Yaw proxy: nose horizontal offset vs eye distance.
+        yaw_proxy = float((nose[0] - mid_eye[0]) / (eye_dist + 1e-6))
+        yaw = float(np.clip(yaw_proxy * 180.0, -89.9, 89.9))
+
+        # Pitch proxy: nose vertical offset vs eye->mouth distance.
+        face_h = float(mid_mouth[1] - mid_eye[1])
+        if not np.isfinite(face_h) or abs(face_h) < 1.0:
+            pitch = 0.0
+        else:
+            pitch_proxy = float((nose[1] - (mid_eye[1] + mid_mouth[1]) * 0.5) / (face_h + 1e-6))
+            pitch = float(np.clip(pitch_proxy * 180.0, -89.9, 89.9))
+
+        # Roll from eye line angle.
+        roll = float(np.degrees(np.arctan2(float(re[1] - le[1]), float(re[0] - le[0]))))
+        roll = float(np.clip(roll, -89.9, 89.9))
+
+        if not np.isfinite([yaw, pitch, roll]).all():
+            return None
+        return yaw, pitch, roll
+    except Exception:
         return None
 
-    image_points = np.asarray(kps, dtype=np.float64)
-
-    # generic 3D model points (approx) corresponding to kps order
-    model_points = np.array(
-        [
-            (-30.0, 30.0, -30.0),  # left_eye
-            (30.0, 30.0, -30.0),   # right_eye
-            (0.0, 0.0, 0.0),       # nose
-            (-25.0, -30.0, -30.0), # left_mouth
-            (25.0, -30.0, -30.0),  # right_mouth
-        ],
-        dtype=np.float64,
-    )
 
-    h, w = frame_shape[:2]
-    focal_length = float(w)
-    center = (w / 2.0, h / 2.0)
-
-    camera_matrix = np.array(
-        [
-            [focal_length, 0, center[0]],
-            [0, focal_length, center[1]],
-            [0, 0, 1],
-        ],
-        dtype=np.float64,
-    )
-    dist_coeffs = np.zeros((4, 1), dtype=np.float64)
+def _pose_fallback_loops(p: np.ndarray) -> Tuple[float, float, float]:
+    # Same math as _pose_fallback_from_kps5_np on a (5,2) float64 array, scalar-only for
+    # numba; NaN yaw stands for "no estimate".
+    nan = np.nan
+    ex = p[1, 0] - p[0, 0]
+    ey = p[1, 1] - p[0, 1]
+    eye_dist = np.sqrt(ex * ex + ey * ey)
+    if not np.isfinite(eye_dist) or eye_dist < 1.0:
+        return nan, nan, nan
+
+    mid_eye_x = (p[0, 0] + p[1, 0]) * 0.5
+    mid_eye_y = (p[0, 1] + p[1, 1]) * 0.5
+    mid_mouth_y = (p[3, 1] + p[4, 1]) * 0.5
+
+    yaw = min(89.9, max(-89.9, (p[2, 0] - mid_eye_x) / (eye_dist + 1e-6) * 180.0))
 
-    def _fallback_from_kps5(points: np.ndarray) -> Optional[Tuple[float, float, float]]:
-        # Geometry-only fallback when solvePnP is unstable/unavailable.
-        # Produces a bounded, monotonic signal good enough for enrollment gating.
+    face_h = mid_mouth_y - mid_eye_y
+    if not np.isfinite(face_h) or abs(face_h) < 1.0:
+        pitch = 0.0
+    else:
+        pitch_proxy = (p[2, 1] - (mid_eye_y + mid_mouth_y) * 0.5) / (face_h + 1e-6)
+        pitch = min(89.9, max(-89.9, pitch_proxy * 180.0))
+
+    roll = min(89.9, max(-89.9, np.degrees(np.arctan2(ey, ex))))
+
+    if not (np.isfinite(yaw) and np.isfinite(pitch) and np.isfinite(roll)):
+        return nan, nan, nan
+    return yaw, pitch, roll
+
+
+if HAVE_NUMBA:
+    _pose_fallback_nb = njit_if_available(_pose_fallback_loops)
+
+    def _pose_fallback_from_kps5(points: np.ndarray) -> Optional[Tuple[float, float, float]]:
         try:
-            le, re, nose, lm, rm = points.astype(np.float32)
-
-            eye_dist = float(np.linalg.norm(re - le))
-            if not np.isfinite(eye_dist) or eye_dist < 1.0:
-                return None
-
-            mid_eye = (le + re) * 0.5
-            mid_mouth = (lm + rm) * 0.5
-
-            # Yaw proxy: nose horizontal offset vs eye distance.
-            yaw_proxy = float((nose[0] - mid_eye[0]) / (eye_dist + 1e-6))
-            yaw = float(np.clip(yaw_proxy * 180.0, -89.9, 89.9))
-
-            # Pitch proxy: nose vertical offset vs eye->mouth distance.
-            face_h = float(mid_mouth[1] - mid_eye[1])
-            if not np.isfinite(face_h) or abs(face_h) < 1.0:
-                pitch = 0.0
-            else:
-                pitch_proxy = float((nose[1] - (mid_eye[1] + mid_mouth[1]) * 0.5) / (face_h + 1e-6))
-                pitch = float(np.clip(pitch_proxy * 180.0, -89.9, 89.9))
-
-            # Roll from eye line angle.
-            roll = float(np.degrees(np.arctan2(float(re[1] - le[1]), float(re[0] - le[0]))))
-            roll = float(np.clip(roll, -89.9, 89.9))
-
-            if not np.isfinite([yaw, pitch, roll]).all():
-                return None
-            return yaw, pitch, roll
+            yaw, pitch, roll = _pose_fallback_nb(np.ascontiguousarray(points, dtype=np.float64).reshape(5, 2))
         except Exception:
             return None
+        if yaw != yaw:  # NaN
+            return None
+        return float(yaw), float(pitch), float(roll)
+
+else:
+    _pose_fallback_from_kps5 = _pose_fallback_from_kps5_np
+
 
+def _wrap180(a: float) -> float:
+    a = float(a)
+    return ((a + 180.0) % 360.0) - 180.0
+
+
+def _solve_head_pose(
+    image_points: np.ndarray,
+    frame_shape: Tuple[int, int, int],
+    guess: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+) -> Tuple[Optional[Tuple[float, float, float]], Optional[Tuple[np.ndarray, np.ndarray]]]:
+    """Returns (angles, (rvec, tvec)); the pose vectors are None when the fallback was used."""
+    h, w = frame_shape[:2]
+    camera_matrix = _camera_matrix(int(h), int(w))
     try:
-        ok, rvec, tvec = cv2.solvePnP(
-            model_points,
-            image_points,
-            camera_matrix,
-            dist_coeffs,
-            flags=cv2.SOLVEPNP_ITERATIVE,
-        )
+        if guess is not None:
+            rvec0, tvec0 = guess[0].copy(), guess[1].copy()
+            ok, rvec, tvec = cv2.solvePnP(
+                _MODEL_POINTS_3D,
+                image_points,
+                camera_matrix,
+                _DIST_COEFFS,
+                rvec0,
+                tvec0,
+                useExtrinsicGuess=True,
+                flags=cv2.SOLVEPNP_ITERATIVE,
+            )
+        else:
+            ok, rvec, tvec = cv2.solvePnP(
+                _MODEL_POINTS_3D,
+                image_points,
+                camera_matrix,
+                _DIST_COEFFS,
+                flags=cv2.SOLVEPNP_ITERATIVE,
+            )
         if not ok:
-            return _fallback_from_kps5(image_points)
+            return _pose_fallback_from_kps5(image_points), None
 
         rmat, _ = cv2.Rodrigues(rvec)
         proj = np.hstack([rmat, tvec.reshape(3, 1)])
@@ -202,14 +264,10 @@ def estimate_head_pose_deg(
         roll = float(euler[2])
 
         if not np.isfinite([yaw, pitch, roll]).all():
-            return None
+            return None, None
 
         # decomposeProjectionMatrix can return valid angles outside [-90, 90] for strong turns.
         # For enrollment gating, we prefer a stable bounded signal over dropping pose entirely.
-        def _wrap180(a: float) -> float:
-            a = float(a)
-            return ((a + 180.0) % 360.0) - 180.0
-
         yaw = _wrap180(yaw)
         pitch = _wrap180(pitch)
         roll = _wrap180(roll)
@@ -218,9 +276,83 @@ def estimate_head_pose_deg(
         pitch = float(np.clip(pitch, -89.9, 89.9))
         roll = float(np.clip(roll, -89.9, 89.9))
 
-        return yaw, pitch, roll
+        return (yaw, pitch, roll), (rvec, tvec)
     except Exception:
-        return _fallback_from_kps5(image_points)
+        return _pose_fallback_from_kps5(image_points), None
+
+
+def estimate_head_pose_deg(
+    kps: np.ndarray,
+    frame_shape: Tuple[int, int, int],
+) -> Optional[Tuple[float, float, float]]:
+    """
+    Robust head-pose estimate: returns (yaw, pitch, roll) in degrees.
+
+    Uses:
+      - solvePnP (ITERATIVE) on 5 landmarks
+      - cv2.decomposeProjectionMatrix to get stable Euler angles
+
+    kps expected shape (5,2) image coords:
+      [left_eye, right_eye, nose, left_mouth, right_mouth]
+    """
+    if kps is None:
+        return None
+    # one conversion: solvePnP wants contiguous float64 points
+    pts = np.ascontiguousarray(kps, dtype=np.float64)
+    if pts.shape != (5, 2):
+        return None
+
+    angles, _ = _solve_head_pose(pts, frame_shape)
+    return angles
+
+
+class HeadPoseTracker:
+    """
+    Per-session head pose: same result as estimate_head_pose_deg, but
+      - reuses the last angles while every landmark moved less than `still_px`
+      - seeds solvePnP with the previous rvec/tvec (useExtrinsicGuess) when it does run
+    """
+
+    def __init__(self, still_px: float = 1.0):
+        self.still_px = float(still_px)
+        self._kps: Optional[np.ndarray] = None
+        self._shape: Optional[Tuple[int, int]] = None
+        self._angles: Optional[Tuple[float, float, float]] = None
+        self._guess: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+    def reset(self) -> None:
+        self._kps = None
+        self._shape = None
+        self._angles = None
+        self._guess = None
+
+    def estimate(
+        self,
+        kps: np.ndarray,
+        frame_shape: Tuple[int, int, int],
+    ) -> Optional[Tuple[float, float, float]]:
+        if kps is None:
+            return None
+        pts = np.ascontiguousarray(kps, dtype=np.float64)
+        if pts.shape != (5, 2):
+            return None
+
+        shape = (int(frame_shape[0]), int(frame_shape[1]))
+        if (
+            self._kps is not None
+            and self._shape == shape
+            and float(np.abs(pts - self._kps).max()) < self.still_px
+        ):
+            return self._angles
+
+        if self._shape != shape:
+            self._guess = None
+        angles, guess = _solve_head_pose(pts, frame_shape, self._guess)
+        self._kps = pts
+        self._shape = shape
+        self._angles = angles
+        self._guess = guess
+        return angles
 
 
 # -----------------------------
@@ -293,53 +425,3 @@ def pose_matches(required: str, yaw: float, pitch: float, cfg_pose: Dict[str, fl
 
     # front
     return abs(yaw) <= front_yaw and abs(pitch) <= front_pitch
-
-
-# -----------------------------
-# Browser HUD overlay (optional)
-# -----------------------------
-def _put_line(img: np.ndarray, text: str, x: int, y: int, scale: float = 0.6, thick: int = 2):
-    cv2.putText(img, text, (x + 1, y + 1), cv2.FONT_HERSHEY_SIMPLEX, scale, (0, 0, 0), thick + 2, cv2.LINE_AA)
-    cv2.putText(img, text, (x, y), cv2.FONT_HERSHEY_SIMPLEX, scale, (255, 255, 255), thick, cv2.LINE_AA)
-
-
-def draw_enroll_hud(frame_bgr: np.ndarray, session: Any, cfg_angles: list[str]) -> np.ndarray:
-    """
-    Draw enrollment status on the frame for /camera/stream.
-    Compatible with both naming styles:
-      - session.current_step OR session.current_angle
-    """
-    img = frame_bgr.copy()
-
-    name = getattr(session, "name", "")
-    required = getattr(session, "current_step", None) or getattr(session, "current_angle", "front")
-    collected = getattr(session, "collected", {}) or {}
-    last_pose = getattr(session, "last_pose", None)
-    last_q = float(getattr(session, "last_quality", 0.0) or 0.0)
-    msg = getattr(session, "last_message", "") or ""
-
-    target_per_pose = int(getattr(session, "target_per_pose", 0) or 0)
-
-    done = 0
-    for a in cfg_angles:
-        c = int(collected.get(a, 0) or 0)
-        if target_per_pose > 0:
-            if c >= target_per_pose:
-                done += 1
-        else:
-            if c > 0:
-                done += 1
-
-    total = len(cfg_angles)
-
-    _put_line(img, f"Enroll: {name} | Required: {required} | {done}/{total}", 12, 30, 0.7, 2)
-
-    if last_pose is not None:
-        _put_line(img, f"pose => {last_pose} | quality={last_q:.1f}", 12, 55, 0.6, 2)
-    else:
-        _put_line(img, f"quality={last_q:.1f}", 12, 55, 0.6, 2)
-
-    if msg:
-        _put_line(img, msg, 12, 80, 0.6, 2)
-
-    return img
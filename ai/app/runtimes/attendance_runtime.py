@@ -3,14 +3,17 @@ from __future__ import annotations
 import os
 import time
 import threading
-from dataclasses import dataclass
-from typing import Any, Dict, List, Tuple, Optional
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Deque, Dict, List, Tuple, Optional
 
 import cv2
 import numpy as np
 
 from ..clients.backend_client import BackendClient
-from ..vision.recognizer import match_gallery
+from ..vision.recognizer import GalleryMatcher, match_gallery
 from ..vision.pipeline_config import Config
 from ..vision.motion_gate import MotionGate as SceneMotionGate
 from ..vision.adaptive_scheduler import AdaptiveScheduler
@@ -20,7 +23,7 @@ from ..vision.gpu_arbiter import GPUArbiter, Detection
 from ..vision.recognizer_runtime import Recognizer, MatchResult
 from ..vision.attendance_debouncer import AttendanceDebouncer
 from ..vision.db_writer import DBWriter, AttendanceWriteJob
-from ..utils import now_iso, l2_normalize, quality_score
+from ..utils import now_iso, l2_normalize_rows, quality_score
 
 from ..fas.gate import FASGate, GateConfig
 
@@ -41,7 +44,43 @@ CARD_KNOWN = (26, 60, 32)  # dark green card
 CARD_UNKNOWN = (50, 30, 30)  # dark red card
 
 
-@dataclass
+# ✅ "Switch-case" / explicit override mapping (checked first)
+# Put the exact strings you expect as keys (usually lowercased)
+_VOICE_EXPLICIT_MAP: Dict[str, str] = {
+    # "exact input name": "what to speak"
+    "asif mamun hridoy": "Hridoy",
+    "raihan jami khan": "Jami",
+    "dipan kumar kundu": "Kundu",
+    "md zahidul islam": "Yuvraj",
+    "rajebul hasan rajon": "Rajon",
+    "tahmid afsar": "Shopno",
+    "eunus nobi rubel": "Rubel",
+    "md. ashanur kabir": "Ashanur kabir",
+    "md. sadmanur islam shishir": "shishir",
+    "md maimoon hossain shomoy": "Shomoy",
+    "bani amin jwel": "Jwel",
+    "s.m rakib rahman tuhin": "Tuhin",
+    "sohanur rahman sohan": "Sohan",
+    "md. nizam uddin shamrat": "Shamrat",
+    "naimul hasan jisan": "Jisan",
+}
+
+# Leading tokens that are titles rather than first names ("Md Rakib" -> "Rakib").
+_VOICE_HONORIFIC_PREFIXES = frozenset(
+    {"mr", "mrs", "ms", "md", "dr", "allama", "mohammad", "s.m", "al"}
+)
+
+
+# Annotated-frame buffers per camera. The pool size must stay above the number of published
+# buffers readers can hold at once: RecognitionWorker keeps only the newest one (readers copy
+# it under its lock), so 2 is the minimum and 3 leaves a slot of headroom.
+_OVERLAY_POOL_SIZE = 3
+
+# Shared result for "no gallery loaded"; MatchResult is treated as read-only by callers.
+_UNKNOWN_EMPTY = MatchResult(person_id=None, name="Unknown", score=-1.0)
+
+
+@dataclass(slots=True)
 class CameraScanState:
     tracker: TrackerManager
     motion: SceneMotionGate
@@ -61,6 +100,71 @@ class CameraScanState:
     last_log_det_applied_total: int = 0
     last_log_rec_calls_total: int = 0
 
+    # ring of reusable annotated-frame buffers (see AttendanceRuntime._overlay_buffer)
+    overlay_pool: List[np.ndarray] = field(default_factory=list)
+    overlay_idx: int = 0
+
+
+@lru_cache(maxsize=4096)
+def _text_size(text: str, font: int, scale: float, thickness: int) -> Tuple[int, int]:
+    # Labels repeat frame to frame (same names, same UI strings); measure each once.
+    (tw, th), _ = cv2.getTextSize(text, font, scale, thickness)
+    return int(tw), int(th)
+
+
+@dataclass(frozen=True, slots=True)
+class _TextLayer:
+    """Pre-rasterized outlined label text as uint8 anti-aliased coverage masks."""
+
+    outline: np.ndarray  # (h, w) uint8, black outline coverage
+    fill: np.ndarray  # (h, w) uint8, colored fill coverage
+    color: Tuple[int, int, int]
+    dx: int  # layer origin relative to the putText anchor
+    dy: int
+
+
+@lru_cache(maxsize=1024)
+def _text_layer(
+    text: str,
+    font: int,
+    scale: float,
+    thickness: int,
+    color: Tuple[int, int, int],
+) -> _TextLayer:
+    # Rasterize the black outline + colored fill once as coverage masks; the same names are
+    # drawn every frame, so per-frame drawing is just a small blend. Masks stay uint8 so a
+    # cached label costs ~2 bytes per pixel.
+    (tw, th), baseline = cv2.getTextSize(text, font, scale, thickness)
+    m = thickness + 6
+    h = th + baseline + 2 * m
+    w = tw + 2 * m
+    org = (m, m + th)
+    outline = np.zeros((h, w), dtype=np.uint8)
+    fill = np.zeros((h, w), dtype=np.uint8)
+    cv2.putText(outline, text, org, font, scale, 255, thickness + 3, cv2.LINE_AA)
+    cv2.putText(fill, text, org, font, scale, 255, thickness, cv2.LINE_AA)
+    return _TextLayer(outline=outline, fill=fill, color=color, dx=-org[0], dy=-org[1])
+
+
+def _blit_text(img: np.ndarray, layer: _TextLayer, x: int, y: int) -> None:
+    h, w = img.shape[:2]
+    lh, lw = layer.fill.shape
+    ox, oy = x + layer.dx, y + layer.dy
+    x0, y0 = max(0, ox), max(0, oy)
+    x1, y1 = min(w, ox + lw), min(h, oy + lh)
+    if x1 <= x0 or y1 <= y0:
+        return
+    roi = img[y0:y1, x0:x1]
+    ly, lx = slice(y0 - oy, y1 - oy), slice(x0 - ox, x1 - ox)
+    a_out = layer.outline[ly, lx, None].astype(np.float32) * np.float32(1.0 / 255.0)
+    a_fill = layer.fill[ly, lx, None].astype(np.float32) * np.float32(1.0 / 255.0)
+    # frame * (1 - outline) * (1 - fill) + color * fill  (black outline adds nothing)
+    out = roi * ((1.0 - a_out) * (1.0 - a_fill))
+    out += a_fill * np.asarray(layer.color, dtype=np.float32)
+    out += 0.5
+    np.clip(out, 0.0, 255.0, out=out)
+    roi[...] = out.astype(np.uint8)
+
 
 def _put_text_white(
     img: np.ndarray, text: str, x: int, y: int, scale: float = 0.8
@@ -85,20 +189,20 @@ def _put_text_with_bg(
     """Draw text with a high-contrast card for readability."""
     font = LABEL_FONT
     thickness = 2
-    (tw, th), _ = cv2.getTextSize(text, font, scale, thickness)
+    tw, th = _text_size(text, font, scale, thickness)
     x0 = max(0, x - pad)
     y0 = max(0, y - th - pad)
     x1 = min(img.shape[1] - 1, x + tw + pad)
     y1 = min(img.shape[0] - 1, y + pad)
 
-    overlay = img.copy()
-    # Rounded-ish corners: draw two rectangles to soften edges
-    cv2.rectangle(overlay, (x0, y0), (x1, y1), bg_color, -1)
-    cv2.rectangle(overlay, (x0 + 2, y0 + 2), (x1 - 2, y1 - 2), bg_color, -1)
-    cv2.addWeighted(overlay, alpha, img, 1 - alpha, 0, img)
+    # Blend only the card's ROI (in place through the view) instead of the whole frame.
+    if x1 >= x0 and y1 >= y0:
+        roi = img[y0 : y1 + 1, x0 : x1 + 1]
+        overlay = np.empty_like(roi)
+        overlay[:] = bg_color
+        cv2.addWeighted(overlay, alpha, roi, 1 - alpha, 0, roi)
 
-    cv2.putText(img, text, (x, y), font, scale, (0, 0, 0), thickness + 3, cv2.LINE_AA)
-    cv2.putText(img, text, (x, y), font, scale, text_color, thickness, cv2.LINE_AA)
+    _blit_text(img, _text_layer(text, font, scale, thickness, tuple(text_color)), x, y)
 
 
 def _draw_label_card(
@@ -116,20 +220,22 @@ def _draw_label_card(
     thickness = 2
     pad = 12
     accent_w = 8
-    (tw, th), _ = cv2.getTextSize(text, font, scale, thickness)
+    tw, th = _text_size(text, font, scale, thickness)
 
     x0 = max(0, x - pad - accent_w)
     y0 = max(0, y - th - pad)
     x1 = min(img.shape[1] - 1, x + tw + pad)
     y1 = min(img.shape[0] - 1, y + pad)
 
-    overlay = img.copy()
-    cv2.rectangle(overlay, (x0, y0), (x1, y1), bg_color, -1)
-    cv2.rectangle(overlay, (x0, y0), (x0 + accent_w, y1), accent, -1)
-    cv2.addWeighted(overlay, 0.7, img, 0.3, 0, img)
+    # Blend only the card's ROI (in place through the view) instead of the whole frame.
+    if x1 >= x0 and y1 >= y0:
+        roi = img[y0 : y1 + 1, x0 : x1 + 1]
+        overlay = np.empty_like(roi)
+        overlay[:] = bg_color
+        overlay[:, : accent_w + 1] = accent
+        cv2.addWeighted(overlay, 0.7, roi, 0.3, 0, roi)
 
-    cv2.putText(img, text, (x, y), font, scale, (0, 0, 0), thickness + 3, cv2.LINE_AA)
-    cv2.putText(img, text, (x, y), font, scale, (255, 255, 255), thickness, cv2.LINE_AA)
+    _blit_text(img, _text_layer(text, font, scale, thickness, (255, 255, 255)), x, y)
 
 
 def _nearest_kps(
@@ -326,6 +432,9 @@ class AttendanceRuntime:
         # Async attendance writer (DB/HTTP/IO should never block the frame loop)
         self._db_writer = DBWriter(write_fn=self._write_attendance_job, max_queue=1000)
         self._debouncer = AttendanceDebouncer(self.cfg)
+        # Fire-and-forget relay/door HTTP calls share two persistent workers instead of a
+        # new thread per call; this also caps concurrency if the relay stops responding.
+        self._relay_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="relay")
 
         # Optional GPU monitoring (guarded; only logs if NVML is available).
         self._nvml = None
@@ -346,6 +455,10 @@ class AttendanceRuntime:
         self._gallery_matrix_by_company: Dict[str, np.ndarray] = {}
         self._gallery_meta_by_company: Dict[str, List[Tuple[int, str, str]]] = {}
         self._gallery_emp_ids_by_company: Dict[str, np.ndarray] = {}
+        self._gallery_matcher_by_company: Dict[str, GalleryMatcher] = {}
+        # top-k depth for FAISS search: most templates of one employee + 1, so the
+        # best different-person match is always among the results
+        self._gallery_topk_by_company: Dict[str, int] = {}
 
         self._cam_state: Dict[str, CameraScanState] = {}
         self._enabled_for_attendance: Dict[str, bool] = {}
@@ -359,14 +472,15 @@ class AttendanceRuntime:
         self._voice_lock = threading.Lock()
         self._voice_cv = threading.Condition(self._voice_lock)
         self._voice_seq: Dict[str, int] = {}  # company_key -> latest seq
-        self._voice_events: Dict[str, List[Dict[str, Any]]] = (
+        self._voice_events: Dict[str, Deque[Dict[str, Any]]] = (
             {}
-        )  # company_key -> events
+        )  # company_key -> events (bounded by ATT_VOICE_MAX_EVENTS)
         self._voice_max_events: int = int(os.getenv("ATT_VOICE_MAX_EVENTS", "500"))
 
-        self._emp_id_to_int_by_company: Dict[str, Dict[str, int]] = {}
-        self._int_to_emp_id_by_company: Dict[str, Dict[int, str]] = {}
-        self._next_emp_int_by_company: Dict[str, int] = {}
+        # company_key -> (emp_id -> int, int -> emp_id, [next synthetic negative int])
+        self._emp_maps_by_company: Dict[
+            str, Tuple[Dict[str, int], Dict[int, str], List[int]]
+        ] = {}
 
         # ---------------------------
         # Face Anti-Spoofing (FAS)
@@ -449,6 +563,13 @@ class AttendanceRuntime:
         except Exception:
             pass
 
+        try:
+            if getattr(self, "_relay_pool", None) is not None:
+                # Drop queued relay/door calls so nothing opens the door after shutdown.
+                self._relay_pool.shutdown(wait=False, cancel_futures=True)
+        except Exception:
+            pass
+
         try:
             if self.erp_queue is not None:
                 self.erp_queue.stop()
@@ -483,68 +604,41 @@ class AttendanceRuntime:
         )
         first_name = tokens[0] if tokens else str(employee_id).strip()
 
-        # ✅ "Switch-case" / explicit override mapping (checked first)
-        # Put the exact strings you expect as keys (usually lowercased)
-        explicit_map = {
-            # "exact input name": "what to speak"
-            "asif mamun hridoy": "Hridoy",
-            "raihan jami khan": "Jami",
-            "dipan kumar kundu": "Kundu",
-            "md zahidul islam": "Yuvraj",
-            "rajebul hasan rajon": "Rajon",
-            "tahmid afsar": "Shopno",
-            "eunus nobi rubel": "Rubel",
-            "md. ashanur kabir": "Ashanur kabir",
-            "md. sadmanur islam shishir": "shishir",
-            "md maimoon hossain shomoy": "Shomoy",
-            "bani amin jwel": "Jwel",
-            "s.m rakib rahman tuhin": "Tuhin",
-            "sohanur rahman sohan": "Sohan",
-            "md. nizam uddin shamrat": "Shamrat",
-            "naimul hasan jisan": "Jisan",
-        }
-
         # Normalize for matching (case-insensitive, ignores commas/dots like above)
         normalized_full = " ".join(tokens).lower().strip()
-        if normalized_full in explicit_map:
-            first_name = explicit_map[normalized_full]
+        first_name = _VOICE_EXPLICIT_MAP.get(normalized_full, first_name)
 
         # ✅ your existing logic remains the same
-        if len(tokens) >= 2 and first_name.lower() in {
-            "mr",
-            "mrs",
-            "ms",
-            "md",
-            "dr",
-            "allama",
-            "mohammad",
-            "s.m",
-            "al",
-        }:
+        if len(tokens) >= 2 and first_name.lower() in _VOICE_HONORIFIC_PREFIXES:
             first_name = tokens[1]
 
         first_name = first_name.strip() or str(employee_id).strip() or "there"
         text = f"Thank you, {first_name}."
+        event: Dict[str, Any] = {
+            "seq": 0,
+            "text": text,
+            "employee_id": str(employee_id),
+            "name": str(name),
+            "camera_id": str(camera_id),
+            "camera_name": str(camera_name),
+            "company_id": company_key,
+            "at": now_iso(),
+        }
+        # Only the seq bump and the append happen under the lock; the deque drops the
+        # oldest event itself once it is full (no slice copy).
         with self._voice_cv:
             seq = self._voice_seq.get(company_key, 0) + 1
             self._voice_seq[company_key] = seq
-            bucket = self._voice_events.setdefault(company_key, [])
-            bucket.append(
-                {
-                    "seq": seq,
-                    "text": text,
-                    "employee_id": str(employee_id),
-                    "name": str(name),
-                    "camera_id": str(camera_id),
-                    "camera_name": str(camera_name),
-                    "company_id": company_key,
-                    "at": now_iso(),
-                }
-            )
-            if self._voice_max_events > 0 and len(bucket) > self._voice_max_events:
-                self._voice_events[company_key] = bucket[-self._voice_max_events :]
+            bucket = self._voice_events.get(company_key)
+            if bucket is None:
+                bucket = deque(
+                    maxlen=self._voice_max_events if self._voice_max_events > 0 else None
+                )
+                self._voice_events[company_key] = bucket
+            event["seq"] = seq
+            bucket.append(event)
             self._voice_cv.notify_all()
-            return seq
+        return seq
 
     def get_voice_events(
         self,
@@ -569,7 +663,7 @@ class AttendanceRuntime:
                 self._voice_cv.wait(timeout=remaining)
 
             latest_seq = int(self._voice_seq.get(company_key, 0))
-            bucket = self._voice_events.get(company_key, [])
+            bucket = self._voice_events.get(company_key, ())
             items = [e for e in bucket if int(e.get("seq", 0)) > after_seq]
         return {"latest_seq": latest_seq, "events": items[:limit]}
 
@@ -611,32 +705,40 @@ class AttendanceRuntime:
             self._clients_by_company[cid] = client
         return client
 
+    def _emp_maps(
+        self, key: str
+    ) -> Tuple[Dict[str, int], Dict[int, str], List[int]]:
+        maps = self._emp_maps_by_company.get(key)
+        if maps is None:
+            maps = ({}, {}, [-2])
+            self._emp_maps_by_company[key] = maps
+        return maps
+
     def _emp_str_to_int(self, company_id: Optional[str], emp_id_str: str) -> int:
         emp_id_str = str(emp_id_str)
-        key = self._gallery_key(company_id)
+        emp_id_to_int, int_to_emp_id, next_int = self._emp_maps(
+            self._gallery_key(company_id)
+        )
 
-        emp_id_to_int = self._emp_id_to_int_by_company.setdefault(key, {})
-        int_to_emp_id = self._int_to_emp_id_by_company.setdefault(key, {})
-        self._next_emp_int_by_company.setdefault(key, -2)
+        # Known ids (numeric or synthetic) resolve with a single lookup.
+        v = emp_id_to_int.get(emp_id_str)
+        if v is not None:
+            return v
 
         if emp_id_str.isdigit():
             v = int(emp_id_str)
-            int_to_emp_id[v] = emp_id_str
-            return v
-
-        if emp_id_str in emp_id_to_int:
-            return emp_id_to_int[emp_id_str]
-
-        v = int(self._next_emp_int_by_company[key])
-        self._next_emp_int_by_company[key] = v - 1
+        else:
+            v = next_int[0]
+            next_int[0] = v - 1
         emp_id_to_int[emp_id_str] = v
         int_to_emp_id[v] = emp_id_str
         return v
 
     def _emp_int_to_str(self, company_id: Optional[str], emp_int: int) -> str:
-        key = self._gallery_key(company_id)
-        mapping = self._int_to_emp_id_by_company.get(key, {})
-        return mapping.get(int(emp_int), str(emp_int))
+        maps = self._emp_maps_by_company.get(self._gallery_key(company_id))
+        if maps is None:
+            return str(emp_int)
+        return maps[1].get(int(emp_int), str(emp_int))
 
     def _ensure_gallery(self, company_id: Optional[str]) -> None:
         key = self._gallery_key(company_id)
@@ -648,6 +750,7 @@ class AttendanceRuntime:
             self._gallery_matrix_by_company[key] = np.zeros((0, 512), dtype=np.float32)
             self._gallery_meta_by_company[key] = []
             self._gallery_emp_ids_by_company[key] = np.zeros((0,), dtype=np.int32)
+            self._gallery_matcher_by_company.pop(key, None)
             self._gallery_last_load_by_company[key] = now
             return
 
@@ -659,6 +762,7 @@ class AttendanceRuntime:
             self._gallery_matrix_by_company[key] = np.zeros((0, 512), dtype=np.float32)
             self._gallery_meta_by_company[key] = []
             self._gallery_emp_ids_by_company[key] = np.zeros((0,), dtype=np.int32)
+            self._gallery_matcher_by_company.pop(key, None)
             self._gallery_last_load_by_company[key] = now
             return
 
@@ -675,7 +779,6 @@ class AttendanceRuntime:
                 continue
 
             emb = np.asarray(emb_list, dtype=np.float32)
-            emb = l2_normalize(emb)
 
             name = str(
                 t.get("employeeName")
@@ -688,16 +791,27 @@ class AttendanceRuntime:
             embs.append(emb)
             meta.append((emp_int, emp_id_str, name))
 
+        # Normalize all templates in one row-wise pass over the stacked matrix.
         self._gallery_matrix_by_company[key] = (
-            np.stack(embs, axis=0) if embs else np.zeros((0, 512), dtype=np.float32)
+            l2_normalize_rows(np.stack(embs, axis=0))
+            if embs
+            else np.zeros((0, 512), dtype=np.float32)
+        )
+        self._gallery_matcher_by_company[key] = GalleryMatcher(
+            self._gallery_matrix_by_company[key],
+            quantize_int8=bool(self.cfg.gallery_int8),
+            use_faiss=bool(self.cfg.gallery_faiss),
         )
         self._gallery_meta_by_company[key] = meta
         if meta:
             self._gallery_emp_ids_by_company[key] = np.asarray(
                 [m[0] for m in meta], dtype=np.int32
             )
+            _ids, counts = np.unique(self._gallery_emp_ids_by_company[key], return_counts=True)
+            self._gallery_topk_by_company[key] = int(counts.max()) + 1
         else:
             self._gallery_emp_ids_by_company[key] = np.zeros((0,), dtype=np.int32)
+            self._gallery_topk_by_company[key] = 1
         self._gallery_last_load_by_company[key] = now
 
     def _get_state(self, camera_id: str) -> CameraScanState:
@@ -718,8 +832,14 @@ class AttendanceRuntime:
         def _match(emb: np.ndarray, *, _cid: str = cid) -> MatchResult:
             return self._match_embedding(_cid, emb)
 
+        def _match_batch(embs: np.ndarray, *, _cid: str = cid) -> List[MatchResult]:
+            return self._match_embeddings(_cid, embs)
+
         recognizer = Recognizer(
-            self.cfg, embedder=self._embedder, match_embedding=_match
+            self.cfg,
+            embedder=self._embedder,
+            match_embedding=_match,
+            match_embeddings=_match_batch,
         )
         now = time.time()
         st = CameraScanState(
@@ -732,6 +852,13 @@ class AttendanceRuntime:
         self._cam_state[cid] = st
         return st
 
+    def _submit_relay(self, fn) -> None:
+        try:
+            self._relay_pool.submit(fn)
+        except RuntimeError:
+            # Pool already shut down: drop the call instead of failing the frame.
+            pass
+
     def _relay_http(
         self, camera_id: str, turn_on: bool, employee_id: Optional[str] = None
     ) -> None:
@@ -777,7 +904,7 @@ class AttendanceRuntime:
             except Exception as e:
                 print(f"[RELAY] failed cid={cid} url={url} err={e}")
 
-        threading.Thread(target=_do, daemon=True).start()
+        self._submit_relay(_do)
 
     def _trigger_door_unlock(
         self,
@@ -830,45 +957,99 @@ class AttendanceRuntime:
             except Exception as e:
                 print(f"[DOOR] unlock failed cam={camera_id} emp={employee_id} err={e}")
 
-        threading.Thread(target=_do, daemon=True).start()
+        self._submit_relay(_do)
 
     # -------------------------
     # Pipeline integration points
     # -------------------------
     def _detect_faces(self, frame_bgr: np.ndarray) -> List[Detection]:
         dets = self._detector.detect(frame_bgr)
+        if not dets:
+            return []
         h, w = frame_bgr.shape[:2]
-        out: List[Detection] = []
-        for d in dets:
-            x1, y1, x2, y2 = [int(v) for v in d.bbox]
-            x1 = max(0, min(w - 1, x1))
-            y1 = max(0, min(h - 1, y1))
-            x2 = max(0, min(w, x2))
-            y2 = max(0, min(h, y2))
-            if x2 <= x1 or y2 <= y1:
-                continue
-            out.append(
-                Detection(
-                    bbox=(x1, y1, x2, y2),
-                    kps=d.kps,
-                    det_score=float(d.det_score),
-                )
-            )
-        return out
+        # int-truncate + clip all boxes in one pass; x1/y1 to the last pixel, x2/y2 to the edge
+        boxes = np.asarray([d.bbox for d in dets], dtype=np.float32).astype(np.int32)
+        np.clip(boxes, 0, np.array([w - 1, h - 1, w, h], dtype=np.int32), out=boxes)
+        valid = (boxes[:, 2] > boxes[:, 0]) & (boxes[:, 3] > boxes[:, 1])
+        return [
+            Detection(bbox=tuple(box), kps=dets[i].kps, det_score=float(dets[i].det_score))
+            for i, box in zip(np.flatnonzero(valid).tolist(), boxes[valid].tolist())
+        ]
 
     def _match_embedding(self, camera_id: str, emb: np.ndarray) -> MatchResult:
         cid = str(camera_id)
         company_id = self._company_by_camera.get(cid) or self._default_company_id
         key = self._gallery_key(company_id)
-        gallery_matrix = self._gallery_matrix_by_company.get(key)
+        matcher = self._gallery_matcher_by_company.get(key)
         gallery_meta = self._gallery_meta_by_company.get(key, [])
         gallery_emp_ids = self._gallery_emp_ids_by_company.get(key)
 
-        if gallery_matrix is None or gallery_matrix.size == 0:
-            return MatchResult(person_id=None, name="Unknown", score=-1.0)
+        if matcher is None or matcher.size == 0:
+            return _UNKNOWN_EMPTY
+
+        if matcher.uses_faiss:
+            idx, scores = matcher.topk(emb, self._gallery_topk_by_company.get(key, 1))
+            return self._match_result_from_topk(idx, scores, gallery_meta, gallery_emp_ids)
+
+        sims = matcher.similarities(emb)
+        return self._match_result_from_sims(sims, gallery_meta, gallery_emp_ids)
+
+    def _match_embeddings(self, camera_id: str, embs: np.ndarray) -> List[MatchResult]:
+        """Batched variant of _match_embedding: one (G,D)@(D,K) GEMM for K embeddings."""
+        cid = str(camera_id)
+        company_id = self._company_by_camera.get(cid) or self._default_company_id
+        key = self._gallery_key(company_id)
+        matcher = self._gallery_matcher_by_company.get(key)
+        gallery_meta = self._gallery_meta_by_company.get(key, [])
+        gallery_emp_ids = self._gallery_emp_ids_by_company.get(key)
+
+        k = int(embs.shape[0])
+        if matcher is None or matcher.size == 0:
+            return [_UNKNOWN_EMPTY] * k
+
+        if matcher.uses_faiss:
+            return [self._match_embedding(cid, embs[j]) for j in range(k)]
+
+        sims = matcher.similarities_batch(embs)
+        return [
+            self._match_result_from_sims(sims[:, j], gallery_meta, gallery_emp_ids)
+            for j in range(k)
+        ]
 
-        sims = gallery_matrix @ emb
-        idx = int(np.argmax(sims))
+    def _match_result_from_topk(
+        self,
+        idx: np.ndarray,
+        scores: np.ndarray,
+        gallery_meta: List[Tuple[int, str, str]],
+        gallery_emp_ids: Optional[np.ndarray],
+    ) -> MatchResult:
+        """Same decision as _match_result_from_sims, from a best-first top-k result."""
+        top = int(idx[0])
+        sim = float(scores[0])
+        if (
+            gallery_emp_ids is not None
+            and gallery_emp_ids.size > 1
+            and float(self.cfg.distinct_sim_margin) > 0.0
+        ):
+            emp_ids = gallery_emp_ids[idx]
+            other = np.flatnonzero(emp_ids != emp_ids[0])
+            if other.size:
+                best_other = float(scores[int(other[0])])
+                if (sim - best_other) < float(self.cfg.distinct_sim_margin):
+                    return MatchResult(person_id=None, name="Unknown", score=sim)
+        if 0 <= top < len(gallery_meta):
+            _emp_int, emp_id_str, name = gallery_meta[top]
+            return MatchResult(person_id=emp_id_str, name=name, score=sim)
+
+        return MatchResult(person_id=None, name="Unknown", score=sim)
+
+    def _match_result_from_sims(
+        self,
+        sims: np.ndarray,
+        gallery_meta: List[Tuple[int, str, str]],
+        gallery_emp_ids: Optional[np.ndarray],
+    ) -> MatchResult:
+        idx = int(sims.argmax())
         sim = float(sims[idx])
         if (
             gallery_emp_ids is not None
@@ -883,11 +1064,9 @@ class AttendanceRuntime:
                     return MatchResult(person_id=None, name="Unknown", score=sim)
         if idx != -1 and idx < len(gallery_meta):
             _emp_int, emp_id_str, name = gallery_meta[idx]
-            return MatchResult(
-                person_id=str(emp_id_str), name=str(name), score=float(sim)
-            )
+            return MatchResult(person_id=emp_id_str, name=name, score=sim)
 
-        return MatchResult(person_id=None, name="Unknown", score=float(sim))
+        return MatchResult(person_id=None, name="Unknown", score=sim)
 
     def _write_attendance_job(self, job: AttendanceWriteJob) -> None:
         cid = str(job.camera_id)
@@ -995,6 +1174,28 @@ class AttendanceRuntime:
         state.last_log_det_applied_total = int(state.det_applied_total)
         state.last_log_rec_calls_total = int(state.rec_calls_total)
 
+    @staticmethod
+    def _overlay_buffer(state: CameraScanState, frame_bgr: np.ndarray) -> np.ndarray:
+        """
+        Copy frame_bgr into the camera's current pooled overlay buffer (no per-frame allocation).
+
+        The ring only moves on in overlay_published(), so a frame that fails before it is
+        published reuses its own buffer instead of wrapping onto the one readers still see.
+        """
+        pool = state.overlay_pool
+        if not pool or pool[0].shape != frame_bgr.shape or pool[0].dtype != frame_bgr.dtype:
+            pool[:] = [np.empty_like(frame_bgr) for _ in range(_OVERLAY_POOL_SIZE)]
+            state.overlay_idx = 0
+        buf = pool[state.overlay_idx]
+        np.copyto(buf, frame_bgr)
+        return buf
+
+    def overlay_published(self, camera_id: str) -> None:
+        """Call once the frame returned by process_frame() is published; the next frame gets a fresh buffer."""
+        state = self._cam_state.get(str(camera_id))
+        if state is not None and state.overlay_pool:
+            state.overlay_idx = (state.overlay_idx + 1) % len(state.overlay_pool)
+
     def process_frame(
         self, frame_bgr: np.ndarray, camera_id: str, name: str
     ) -> np.ndarray:
@@ -1009,14 +1210,15 @@ class AttendanceRuntime:
         state.company_id = company_id
         state.frame_idx += 1
         state.frames_total += 1
+        tracker, scheduler = state.tracker, state.scheduler
 
         enable_attendance = self.is_attendance_enabled(cid)
-        annotated = frame_bgr.copy()
+        annotated = self._overlay_buffer(state, frame_bgr)
 
         now = time.time()
 
         # Always run CPU tracking each frame.
-        tracks = state.tracker.update(frame_bgr, now=now)
+        tracks = tracker.update(frame_bgr, now=now)
 
         # Motion gate runs each frame too, but we ignore motion inside stable known tracks so
         # a single recognized person walking/running doesn't keep GPU detection in NORMAL/BURST.
@@ -1045,29 +1247,29 @@ class AttendanceRuntime:
             state.last_det_seq = int(det_res.seq)
 
             if max_det_age > 0.0 and det_age > max_det_age:
-                state.scheduler.force_burst("stale_det", now=now)
+                scheduler.force_burst("stale_det", now=now)
             else:
                 state.det_applied_total += 1
 
-                new_ids = state.tracker.apply_detections(
+                new_ids = tracker.apply_detections(
                     frame_bgr, det_res.detections, now=now
                 )
                 if new_ids:
                     events.add("new_track")
                     new_id_set = set(new_ids)
                     # New tracks get immediate high-stakes recognition window.
-                    for tr in state.tracker.tracks():
+                    for tr in tracker.tracks():
                         if tr.track_id in new_id_set:
                             tr.force_recognition_until_ts = max(
                                 tr.force_recognition_until_ts,
                                 now + float(self.cfg.burst_seconds),
                             )
                 # Detection just updated boxes; force a quick recognition pass on fresh bboxes.
-                for tr in state.tracker.tracks():
+                for tr in tracker.tracks():
                     tr.force_recognition_until_ts = max(
                         tr.force_recognition_until_ts, now + 0.35
                     )
-                tracks = state.tracker.tracks()
+                tracks = tracker.tracks()
 
         # Scheduler mode update.
         tracks_attention = False
@@ -1080,7 +1282,7 @@ class AttendanceRuntime:
                 or tr0.person_id is None
                 or int(tr0.stable_id_hits) < int(self.cfg.stable_id_confirmations)
             )
-        state.scheduler.update(
+        scheduler.update(
             motion_active=motion_active,
             tracks_present=bool(tracks_attention),
             events=events,
@@ -1088,13 +1290,13 @@ class AttendanceRuntime:
         )
 
         # Scheduled GPU detection (round-robin arbitration, newest-frame only).
-        if state.scheduler.should_run_detection(now=now):
+        if scheduler.should_run_detection(now=now):
             self._gpu.submit(cid, frame_bgr, ts=now)
-            state.scheduler.mark_detection_submitted(now=now)
+            scheduler.mark_detection_submitted(now=now)
 
         # Scheduled per-track recognition (CPU by default).
         rec_stats = state.recognizer.update_tracks(
-            frame_bgr, tracks, state.scheduler, now=now
+            frame_bgr, tracks, scheduler, now=now
         )
         state.rec_calls_total += int(rec_stats.get("recognition_calls", 0) or 0)
 
@@ -1102,7 +1304,7 @@ class AttendanceRuntime:
         # _put_text_white(annotated, f"frame={state.frame_idx}", 12, 36, scale=1.05)
         # _put_text_white(
         #     annotated,
-        #     f"mode={state.scheduler.mode_label()} motion={motion_score:.3f}",
+        #     f"mode={scheduler.mode_label()} motion={motion_score:.3f}",
         #     12,
         #     68,
         #     scale=0.75,
@@ -1160,7 +1362,7 @@ class AttendanceRuntime:
                 camera_name=camera_name,
                 company_id=company_id,
                 track=tr,
-                scheduler=state.scheduler,
+                scheduler=scheduler,
                 now=now,
             )
             if decision.job is None:
@@ -1,5 +1,5 @@
 from __future__ import annotations
-from typing import Dict, Optional
+from typing import Dict, Optional, Tuple
 import threading
 import cv2
 import numpy as np
@@ -13,6 +13,7 @@ class CameraRuntime:
         self._lock = threading.Lock()
         self.injected_frames: Dict[str, np.ndarray] = {}
         self.injected_locks: Dict[str, threading.Lock] = {}
+        self.injected_seq: Dict[str, int] = {}
 
     def start(self, camera_id: str, rtsp_url: str, width: int = 1280, height: int = 720) -> bool:
         """
@@ -66,6 +67,7 @@ class CameraRuntime:
             self.injected_locks[camera_id] = threading.Lock()
         with self.injected_locks[camera_id]:
             self.injected_frames[camera_id] = frame
+            self.injected_seq[camera_id] = self.injected_seq.get(camera_id, 0) + 1
 
     def get_frame(self, camera_id: str) -> Optional[np.ndarray]:
         # 1) Laptop camera (injected frames)
@@ -83,3 +85,40 @@ class CameraRuntime:
             return grabber.read_latest()
 
         return None
+
+    def frame_seq(self, camera_id: str) -> int:
+        """Cheap "has a new frame arrived?" probe: the counter get_frame_with_seq would return."""
+        lock = self.injected_locks.get(camera_id)
+        if lock:
+            with lock:
+                if self.injected_frames.get(camera_id) is not None:
+                    return self.injected_seq.get(camera_id, 0)
+
+        with self._lock:
+            grabber = self.cameras.get(camera_id)
+        if grabber:
+            return grabber.seq
+
+        return -1
+
+    def get_frame_with_seq(
+        self, camera_id: str, copy: bool = True
+    ) -> Tuple[Optional[np.ndarray], int]:
+        """
+        Same source order as get_frame(), plus a per-source frame counter so callers
+        can skip work when the frame has not changed since their last read.
+        copy=False skips the IP-camera frame copy (read-only callers only).
+        """
+        lock = self.injected_locks.get(camera_id)
+        if lock:
+            with lock:
+                frame = self.injected_frames.get(camera_id)
+                if frame is not None:
+                    return frame, self.injected_seq.get(camera_id, 0)
+
+        with self._lock:
+            grabber = self.cameras.get(camera_id)
+        if grabber:
+            return grabber.read_latest_with_seq(copy=copy)
+
+        return None, -1
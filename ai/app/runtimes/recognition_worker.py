@@ -135,3 +135,5 @@ class RecognitionWorker:
             with lock:
                 self._latest_frame[camera_id] = annotated
                 self._latest_jpg[camera_id] = (jpg_bytes, time.time())
+            # annotated is a pooled buffer: only advance the pool once it is published
+            self.attendance_rt.overlay_published(camera_id)
@@ -194,7 +194,8 @@ def mjpeg_generator_enroll2_auto(
                     "msg": str(st.get("message") or ""),
                     "roi_faces": str(st.get("roi_faces") or 0),
                 }
-                frame = draw_enroll2_auto_hud(frame, roi, primary, hud)
+                # scratch frame is safe: it is JPEG-encoded below before the next draw
+                frame = draw_enroll2_auto_hud(frame, roi, primary, hud, reuse_buffer=True)
 
             ok, jpg = cv2.imencode(".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), 70])
             if not ok:
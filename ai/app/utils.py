@@ -2,11 +2,19 @@ from __future__ import annotations
 import os
 import time
 from datetime import datetime
+from functools import lru_cache
 from typing import Optional, Tuple
 
 import numpy as np
 import cv2
 
+try:  # optional: JIT for small per-frame numeric kernels
+    from numba import njit as _numba_njit
+except Exception:
+    _numba_njit = None
+
+HAVE_NUMBA = _numba_njit is not None
+
 
 def now_iso() -> str:
     return datetime.now().isoformat(timespec="seconds")
@@ -22,6 +30,20 @@ def l2_normalize(x: np.ndarray, eps: float = 1e-12) -> np.ndarray:
     return x / n
 
 
+def l2_normalize_rows(x: np.ndarray, eps: float = 1e-12) -> np.ndarray:
+    """Row-wise l2_normalize of an (N, D) matrix in one pass -> float32."""
+    x = np.asarray(x, dtype=np.float32)
+    n = np.sqrt(np.einsum("nd,nd->n", x, x)) + np.float32(eps)
+    return x / n[:, None]
+
+
+def njit_if_available(fn):
+    """Compile `fn` with numba.njit(cache=True) when numba is installed; else return it as-is."""
+    if _numba_njit is None:
+        return fn
+    return _numba_njit(cache=True)(fn)
+
+
 def sleep_fps(target_fps: float, t0: float) -> None:
     if target_fps <= 0:
         return
@@ -52,6 +74,37 @@ def quality_score(face_bbox, frame_bgr) -> float:
     return float(max(0.0, min(100.0, score)))
 
 
+# Generic 3D model points (approx) corresponding to kps order:
+# left_eye, right_eye, nose, left_mouth, right_mouth
+_MODEL_POINTS_3D = np.array(
+    [
+        (-30.0, 30.0, -30.0),
+        (30.0, 30.0, -30.0),
+        (0.0, 0.0, 0.0),
+        (-25.0, -30.0, -30.0),
+        (25.0, -30.0, -30.0),
+    ],
+    dtype=np.float64,
+)
+_DIST_COEFFS = np.zeros((4, 1), dtype=np.float64)
+
+
+@lru_cache(maxsize=8)
+def _camera_matrix(h: int, w: int) -> np.ndarray:
+    # intrinsics only depend on the frame size, which is fixed per camera
+    focal_length = float(w)
+    m = np.array(
+        [
+            [focal_length, 0, w / 2.0],
+            [0, focal_length, h / 2.0],
+            [0, 0, 1],
+        ],
+        dtype=np.float64,
+    )
+    m.setflags(write=False)  # shared across calls
+    return m
+
+
 def estimate_head_pose_deg(kps: np.ndarray, frame_shape) -> Optional[Tuple[float, float, float]]:
     """
     Robust head-pose estimate: returns (yaw, pitch, roll) in degrees.
@@ -63,44 +116,21 @@ def estimate_head_pose_deg(kps: np.ndarray, frame_shape) -> Optional[Tuple[float
     kps expected shape (5,2) in image coords:
       [left_eye, right_eye, nose, left_mouth, right_mouth]
     """
-    if kps is None or np.asarray(kps).shape != (5, 2):
+    if kps is None:
+        return None
+    image_points = np.ascontiguousarray(kps, dtype=np.float64)
+    if image_points.shape != (5, 2):
         return None
-
-    image_points = np.asarray(kps, dtype=np.float64)
-
-    # Generic 3D model points (approx) corresponding to kps order:
-    # left_eye, right_eye, nose, left_mouth, right_mouth
-    model_points = np.array(
-        [
-            (-30.0, 30.0, -30.0),
-            (30.0, 30.0, -30.0),
-            (0.0, 0.0, 0.0),
-            (-25.0, -30.0, -30.0),
-            (25.0, -30.0, -30.0),
-        ],
-        dtype=np.float64,
-    )
 
     h, w = frame_shape[:2]
-    focal_length = float(w)
-    center = (w / 2.0, h / 2.0)
-
-    camera_matrix = np.array(
-        [
-            [focal_length, 0, center[0]],
-            [0, focal_length, center[1]],
-            [0, 0, 1],
-        ],
-        dtype=np.float64,
-    )
-    dist_coeffs = np.zeros((4, 1), dtype=np.float64)
+    camera_matrix = _camera_matrix(int(h), int(w))
 
     try:
         ok, rvec, tvec = cv2.solvePnP(
-            model_points,
+            _MODEL_POINTS_3D,
             image_points,
             camera_matrix,
-            dist_coeffs,
+            _DIST_COEFFS,
             flags=cv2.SOLVEPNP_ITERATIVE,
         )
         if not ok:
@@ -55,6 +55,7 @@ class FrameGrabber:
         self.cap: Optional[cv2.VideoCapture] = None
         self._lock = threading.Lock()
         self._frame: Optional[np.ndarray] = None
+        self._seq = 0  # bumps on every new frame
         self._running = False
         self._thread: Optional[threading.Thread] = None
 
@@ -73,6 +74,25 @@ class FrameGrabber:
                 return None
             return self._frame.copy()
 
+    @property
+    def seq(self) -> int:
+        """Current frame counter (no copy)."""
+        with self._lock:
+            return self._seq
+
+    def read_latest_with_seq(self, copy: bool = True) -> Tuple[Optional[np.ndarray], int]:
+        """
+        Like read_latest(), plus a counter that changes only when a new frame arrives.
+
+        copy=False returns the stored frame itself. cap.read() hands the loop a fresh array
+        per frame and the stored one is only ever replaced, never written, so this is safe
+        for read-only callers (they must not draw on it).
+        """
+        with self._lock:
+            if self._frame is None:
+                return None, self._seq
+            return (self._frame.copy() if copy else self._frame), self._seq
+
     def stop(self):
         self._running = False
 
@@ -220,6 +240,7 @@ class FrameGrabber:
                 reopen_backoff = float(self.frame_reopen_wait_sec)
                 with self._lock:
                     self._frame = frame
+                    self._seq += 1
                 continue
 
             fails += 1
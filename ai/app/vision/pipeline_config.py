@@ -56,6 +56,10 @@ class Config:
     borderline_margin: float = 0.05
     # Require top1 to be meaningfully higher than the best different-person match.
     distinct_sim_margin: float = 0.05
+    # Store the gallery as per-row int8 (4x smaller). Worth it only for very large galleries.
+    gallery_int8: bool = False
+    # Search the float32 gallery through a faiss.IndexFlatIP (needs faiss; ignored with gallery_int8).
+    gallery_faiss: bool = False
 
     # --- Attendance gating ---
     attendance_debounce_seconds: float = 10.0
@@ -144,6 +148,8 @@ class Config:
         cfg.similarity_threshold = _env_float("SIMILARITY_THRESHOLD", cfg.similarity_threshold)
         cfg.borderline_margin = _env_float("BORDERLINE_MARGIN", cfg.borderline_margin)
         cfg.distinct_sim_margin = _env_float("DISTINCT_SIM_MARGIN", cfg.distinct_sim_margin)
+        cfg.gallery_int8 = _env_bool("GALLERY_INT8", cfg.gallery_int8)
+        cfg.gallery_faiss = _env_bool("GALLERY_FAISS", cfg.gallery_faiss)
         cfg.strict_similarity_threshold = _env_float(
             "STRICT_SIM_THRESHOLD", cfg.strict_similarity_threshold
         )
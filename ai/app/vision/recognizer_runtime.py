@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Callable, Optional, Sequence
+from typing import Callable, List, Optional, Sequence, Tuple
 import time
 
 import numpy as np
@@ -12,6 +12,28 @@ from .tracker_manager import Track
 from .insightface_models import FaceEmbedder
 
 
+def _bbox_iou(a: Tuple[int, int, int, int], b: Tuple[int, int, int, int]) -> float:
+    # Plain compares instead of builtin max/min calls; disjoint or empty boxes exit early,
+    # so the areas below are positive and the union needs no epsilon.
+    ix1 = a[0] if a[0] > b[0] else b[0]
+    iy1 = a[1] if a[1] > b[1] else b[1]
+    ix2 = a[2] if a[2] < b[2] else b[2]
+    iy2 = a[3] if a[3] < b[3] else b[3]
+    iw = ix2 - ix1
+    ih = iy2 - iy1
+    if iw <= 0 or ih <= 0:
+        return 0.0
+    inter = iw * ih
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def _bbox_center_distance(a: Tuple[int, int, int, int], b: Tuple[int, int, int, int]) -> float:
+    dx = (a[0] + a[2] - b[0] - b[2]) * 0.5
+    dy = (a[1] + a[3] - b[1] - b[3]) * 0.5
+    return float((dx * dx + dy * dy) ** 0.5)
+
+
 @dataclass(slots=True)
 class MatchResult:
     person_id: Optional[str]
@@ -24,6 +46,7 @@ class Recognizer:
     Track-level recognizer that uses existing hooks:
       - embed_face(...) via FaceEmbedder
       - match_embedding(emb) -> (person_id,name,score)
+      - match_embeddings(embs) -> [MatchResult] (optional batched variant, one GEMM)
     """
 
     def __init__(
@@ -32,10 +55,12 @@ class Recognizer:
         *,
         embedder: FaceEmbedder,
         match_embedding: Callable[[np.ndarray], MatchResult],
+        match_embeddings: Optional[Callable[[np.ndarray], Sequence[MatchResult]]] = None,
     ):
         self.cfg = cfg
         self._embedder = embedder
         self._match_embedding = match_embedding
+        self._match_embeddings = match_embeddings
 
     def update_tracks(
         self,
@@ -50,27 +75,7 @@ class Recognizer:
         calls = 0
         unknowns = 0
         borderlines = 0
-
-        def _bbox_iou(a: tuple[int, int, int, int], b: tuple[int, int, int, int]) -> float:
-            ax1, ay1, ax2, ay2 = a
-            bx1, by1, bx2, by2 = b
-            ix1, iy1 = max(ax1, bx1), max(ay1, by1)
-            ix2, iy2 = min(ax2, bx2), min(ay2, by2)
-            iw = max(0, ix2 - ix1)
-            ih = max(0, iy2 - iy1)
-            inter = iw * ih
-            area_a = max(0, ax2 - ax1) * max(0, ay2 - ay1)
-            area_b = max(0, bx2 - bx1) * max(0, by2 - by1)
-            union = area_a + area_b - inter + 1e-6
-            return float(inter / union)
-
-        def _bbox_center_distance(a: tuple[int, int, int, int], b: tuple[int, int, int, int]) -> float:
-            ax1, ay1, ax2, ay2 = a
-            bx1, by1, bx2, by2 = b
-            acx, acy = (ax1 + ax2) * 0.5, (ay1 + ay2) * 0.5
-            bcx, bcy = (bx1 + bx2) * 0.5, (by1 + by2) * 0.5
-            dx, dy = (acx - bcx), (acy - bcy)
-            return float((dx * dx + dy * dy) ** 0.5)
+        pending: List[Tuple[Track, np.ndarray, bool]] = []
 
         for tr in tracks:
             if not scheduler.should_run_recognition(tr, now=now):
@@ -97,13 +102,12 @@ class Recognizer:
                 and isinstance(cur_bbox, tuple)
             ):
                 try:
-                    bbox_iou = _bbox_iou(tuple(int(v) for v in cur_bbox), tuple(int(v) for v in last_known_bbox))
-                    center_shift = _bbox_center_distance(
-                        tuple(int(v) for v in cur_bbox),
-                        tuple(int(v) for v in last_known_bbox),
-                    )
-                    cx1, cy1, cx2, cy2 = tuple(int(v) for v in cur_bbox)
-                    kx1, ky1, kx2, ky2 = tuple(int(v) for v in last_known_bbox)
+                    cur = tuple(int(v) for v in cur_bbox)
+                    known = tuple(int(v) for v in last_known_bbox)
+                    bbox_iou = _bbox_iou(cur, known)
+                    center_shift = _bbox_center_distance(cur, known)
+                    cx1, cy1, cx2, cy2 = cur
+                    kx1, ky1, kx2, ky2 = known
                     max_dim = float(
                         max(
                             1,
@@ -155,92 +159,120 @@ class Recognizer:
                     unknowns += 1
                 continue
 
-            m = self._match_embedding(emb)
-            score = float(m.score)
-            new_id = str(m.person_id) if m.person_id is not None else None
+            pending.append((tr, emb, hold_ok))
 
-            strict_thr = float(
-                max(
-                    float(self.cfg.similarity_threshold),
-                    float(getattr(self.cfg, "strict_similarity_threshold", self.cfg.similarity_threshold)),
-                )
-            )
-            is_new_or_flip = (
-                new_id is not None and (tr.person_id is None or tr.person_id != new_id)
+        if pending:
+            results = self._match_pending([emb for _tr, emb, _hold in pending])
+            for (tr, _emb, hold_ok), m in zip(pending, results):
+                u, b = self._apply_match(tr, m, hold_ok=hold_ok, scheduler=scheduler, now=now)
+                unknowns += u
+                borderlines += b
+
+        return {"recognition_calls": calls, "unknown_tracks": unknowns, "borderline_tracks": borderlines}
+
+    def _match_pending(self, embs: List[np.ndarray]) -> List[MatchResult]:
+        # One SGEMM for all tracks refreshed this frame instead of one SGEMV per track.
+        if self._match_embeddings is not None and len(embs) > 1:
+            return list(self._match_embeddings(np.stack(embs, axis=0)))
+        return [self._match_embedding(e) for e in embs]
+
+    def _apply_match(
+        self,
+        tr: Track,
+        m: MatchResult,
+        *,
+        hold_ok: bool,
+        scheduler: AdaptiveScheduler,
+        now: float,
+    ) -> tuple[int, int]:
+        """Apply one gallery match to a track. Returns (unknown, borderline) counts (0/1)."""
+        unknown = 0
+        borderline = 0
+
+        score = float(m.score)
+        new_id = str(m.person_id) if m.person_id is not None else None
+
+        strict_thr = float(
+            max(
+                float(self.cfg.similarity_threshold),
+                float(getattr(self.cfg, "strict_similarity_threshold", self.cfg.similarity_threshold)),
             )
-            accept_thr = strict_thr if is_new_or_flip else float(self.cfg.similarity_threshold)
-
-            # borderline around decision threshold => burst to disambiguate
-            if abs(score - float(self.cfg.similarity_threshold)) <= float(self.cfg.borderline_margin):
-                # For already-stable known tracks, prefer a recognition-only recheck instead of
-                # forcing GPU detection into BURST (keeps GPU cool when the same person is present).
-                stable_known = (
-                    tr.person_id is not None
-                    and int(getattr(tr, "stable_id_hits", 0) or 0) >= int(self.cfg.stable_id_confirmations)
-                )
-                if not stable_known:
-                    scheduler.force_burst("borderline", now=now)
-                tr.force_recognition_until_ts = max(tr.force_recognition_until_ts, now + self.cfg.burst_seconds)
-                borderlines += 1
+        )
+        is_new_or_flip = (
+            new_id is not None and (tr.person_id is None or tr.person_id != new_id)
+        )
+        accept_thr = strict_thr if is_new_or_flip else float(self.cfg.similarity_threshold)
 
-            if new_id is None or score < accept_thr:
-                # If we had a confident identity very recently, keep it briefly even if the
-                # current embedding is low-confidence (motion blur / partial face).
-                if tr.person_id is not None and hold_ok:
-                    tr.similarity = score
-                    tr.force_recognition_until_ts = max(tr.force_recognition_until_ts, now + 0.45)
-                    continue
+        # borderline around decision threshold => burst to disambiguate
+        if abs(score - float(self.cfg.similarity_threshold)) <= float(self.cfg.borderline_margin):
+            # For already-stable known tracks, prefer a recognition-only recheck instead of
+            # forcing GPU detection into BURST (keeps GPU cool when the same person is present).
+            stable_known = (
+                tr.person_id is not None
+                and int(getattr(tr, "stable_id_hits", 0) or 0) >= int(self.cfg.stable_id_confirmations)
+            )
+            if not stable_known:
+                scheduler.force_burst("borderline", now=now)
+            tr.force_recognition_until_ts = max(tr.force_recognition_until_ts, now + self.cfg.burst_seconds)
+            borderline = 1
 
-                if tr.person_id is not None:
-                    tr.last_identity_change_ts = now
-                tr.person_id = None
-                tr.name = "Unknown"
+        if new_id is None or score < accept_thr:
+            # If we had a confident identity very recently, keep it briefly even if the
+            # current embedding is low-confidence (motion blur / partial face).
+            if tr.person_id is not None and hold_ok:
                 tr.similarity = score
-                tr.stable_id_hits = 0
-                tr.last_known_ts = 0.0
-                tr.last_known_bbox = None
-                if tr.unknown_since_ts <= 0.0:
-                    tr.unknown_since_ts = now
-                unknowns += 1
+                tr.force_recognition_until_ts = max(tr.force_recognition_until_ts, now + 0.45)
+                return unknown, borderline
 
-                if (now - tr.unknown_since_ts) >= float(self.cfg.unknown_burst_after_seconds):
-                    scheduler.force_burst("unknown_persist", now=now)
-                    tr.force_recognition_until_ts = max(tr.force_recognition_until_ts, now + self.cfg.burst_seconds)
-                continue
+            if tr.person_id is not None:
+                tr.last_identity_change_ts = now
+            tr.person_id = None
+            tr.name = "Unknown"
+            tr.similarity = score
+            tr.stable_id_hits = 0
+            tr.last_known_ts = 0.0
+            tr.last_known_bbox = None
+            if tr.unknown_since_ts <= 0.0:
+                tr.unknown_since_ts = now
+            unknown = 1
 
-            # Known
-            if tr.person_id is not None and tr.person_id != new_id:
-                # Avoid rapid flips during movement. Only accept a new id if it is clearly
-                # above threshold+margin; otherwise show Unknown (never keep the old name).
-                if score < float(self.cfg.similarity_threshold + self.cfg.borderline_margin):
-                    scheduler.force_burst("identity_flip", now=now)
-                    tr.force_recognition_until_ts = max(tr.force_recognition_until_ts, now + self.cfg.burst_seconds)
-                    tr.person_id = None
-                    tr.name = "Unknown"
-                    tr.similarity = score
-                    tr.stable_id_hits = 0
-                    tr.unknown_since_ts = now if tr.unknown_since_ts <= 0.0 else tr.unknown_since_ts
-                    tr.last_identity_change_ts = now
-                    tr.last_known_ts = 0.0
-                    tr.last_known_bbox = None
-                    continue
+            if (now - tr.unknown_since_ts) >= float(self.cfg.unknown_burst_after_seconds):
+                scheduler.force_burst("unknown_persist", now=now)
+                tr.force_recognition_until_ts = max(tr.force_recognition_until_ts, now + self.cfg.burst_seconds)
+            return unknown, borderline
 
+        # Known
+        if tr.person_id is not None and tr.person_id != new_id:
+            # Avoid rapid flips during movement. Only accept a new id if it is clearly
+            # above threshold+margin; otherwise show Unknown (never keep the old name).
+            if score < float(self.cfg.similarity_threshold + self.cfg.borderline_margin):
                 scheduler.force_burst("identity_flip", now=now)
                 tr.force_recognition_until_ts = max(tr.force_recognition_until_ts, now + self.cfg.burst_seconds)
-                tr.last_identity_change_ts = now
+                tr.person_id = None
+                tr.name = "Unknown"
+                tr.similarity = score
                 tr.stable_id_hits = 0
-
-            if tr.person_id == new_id:
-                tr.stable_id_hits = int(tr.stable_id_hits) + 1
-            else:
+                tr.unknown_since_ts = now if tr.unknown_since_ts <= 0.0 else tr.unknown_since_ts
                 tr.last_identity_change_ts = now
-                tr.stable_id_hits = 1
+                tr.last_known_ts = 0.0
+                tr.last_known_bbox = None
+                return unknown, borderline
 
-            tr.person_id = new_id
-            tr.name = str(m.name or new_id)
-            tr.similarity = score
-            tr.unknown_since_ts = 0.0
-            tr.last_known_ts = now
-            tr.last_known_bbox = tr.bbox
+            scheduler.force_burst("identity_flip", now=now)
+            tr.force_recognition_until_ts = max(tr.force_recognition_until_ts, now + self.cfg.burst_seconds)
+            tr.last_identity_change_ts = now
+            tr.stable_id_hits = 0
 
-        return {"recognition_calls": calls, "unknown_tracks": unknowns, "borderline_tracks": borderlines}
+        if tr.person_id == new_id:
+            tr.stable_id_hits = int(tr.stable_id_hits) + 1
+        else:
+            tr.last_identity_change_ts = now
+            tr.stable_id_hits = 1
+
+        tr.person_id = new_id
+        tr.name = str(m.name or new_id)
+        tr.similarity = score
+        tr.unknown_since_ts = 0.0
+        tr.last_known_ts = now
+        tr.last_known_bbox = tr.bbox
+        return unknown, borderline
@@ -11,27 +11,64 @@ from .gpu_arbiter import Detection
 from .pipeline_config import Config
 
 
-def _bbox_iou(a: Tuple[int, int, int, int], b: Tuple[int, int, int, int]) -> float:
-    ax1, ay1, ax2, ay2 = a
-    bx1, by1, bx2, by2 = b
-    ix1, iy1 = max(ax1, bx1), max(ay1, by1)
-    ix2, iy2 = min(ax2, bx2), min(ay2, by2)
-    iw = max(0, ix2 - ix1)
-    ih = max(0, iy2 - iy1)
-    inter = iw * ih
-    area_a = max(0, ax2 - ax1) * max(0, ay2 - ay1)
-    area_b = max(0, bx2 - bx1) * max(0, by2 - by1)
-    union = area_a + area_b - inter + 1e-6
-    return float(inter / union)
-
+def _scored_pairs(
+    track_boxes: np.ndarray,
+    det_boxes: np.ndarray,
+    track_ids: np.ndarray,
+    iou_thr: float,
+    center_px: float,
+) -> List[Tuple[int, int, float, float]]:
+    """
+    Candidate (track_id, det_idx, iou, center_dist) pairs, best first.
 
-def _center_dist(a: Tuple[int, int, int, int], b: Tuple[int, int, int, int]) -> float:
-    ax1, ay1, ax2, ay2 = a
-    bx1, by1, bx2, by2 = b
-    acx, acy = (ax1 + ax2) * 0.5, (ay1 + ay2) * 0.5
-    bcx, bcy = (bx1 + bx2) * 0.5, (by1 + by2) * 0.5
-    dx, dy = acx - bcx, acy - bcy
-    return float((dx * dx + dy * dy) ** 0.5)
+    All (T,D) IoU / center-distance / area-ratio gates are evaluated as broadcast arrays and
+    ordered with one np.lexsort on (score, iou, -dist, track_id, det_idx) descending.
+    """
+    if track_boxes.shape[0] == 0 or det_boxes.shape[0] == 0:
+        return []
+    t = track_boxes[:, None, :]
+    b = det_boxes[None, :, :]
+
+    tw = np.maximum(1, t[..., 2] - t[..., 0])
+    th = np.maximum(1, t[..., 3] - t[..., 1])
+    bw = np.maximum(1, b[..., 2] - b[..., 0])
+    bh = np.maximum(1, b[..., 3] - b[..., 1])
+    area_ratio = (bw * bh) / ((tw * th) + 1e-6)
+
+    iw = np.maximum(0, np.minimum(t[..., 2], b[..., 2]) - np.maximum(t[..., 0], b[..., 0]))
+    ih = np.maximum(0, np.minimum(t[..., 3], b[..., 3]) - np.maximum(t[..., 1], b[..., 1]))
+    inter = iw * ih
+    area_t = np.maximum(0, t[..., 2] - t[..., 0]) * np.maximum(0, t[..., 3] - t[..., 1])
+    area_b = np.maximum(0, b[..., 2] - b[..., 0]) * np.maximum(0, b[..., 3] - b[..., 1])
+    iou = inter / (area_t + area_b - inter + 1e-6)
+
+    dx = (t[..., 0] + t[..., 2]) * 0.5 - (b[..., 0] + b[..., 2]) * 0.5
+    dy = (t[..., 1] + t[..., 3]) * 0.5 - (b[..., 1] + b[..., 3]) * 0.5
+    dist = np.sqrt(dx * dx + dy * dy)
+
+    # Avoid matching across people: require centers to be close relative to box size.
+    max_dim = np.maximum(np.maximum(tw, th), np.maximum(bw, bh))
+    eff_center = np.minimum(center_px, 0.80 * max_dim)
+
+    ok = (area_ratio >= 0.50) & (area_ratio <= 2.00) & ((iou >= iou_thr) | (dist <= eff_center))
+    ti, di = np.nonzero(ok)
+    if ti.size == 0:
+        return []
+    iou = iou[ti, di]
+    dist = dist[ti, di]
+    # Score: prioritize IoU, lightly penalize normalized distance.
+    score = iou - dist / np.maximum(1.0, eff_center[ti, di] * 4.0)
+    tid = track_ids[ti]
+
+    order = np.lexsort((di, tid, -dist, iou, score))[::-1]
+    return list(
+        zip(
+            tid[order].tolist(),
+            di[order].tolist(),
+            iou[order].tolist(),
+            dist[order].tolist(),
+        )
+    )
 
 
 def _xyxy_to_xywh_int(b: Tuple[int, int, int, int]) -> Tuple[int, int, int, int]:
@@ -217,41 +254,16 @@ class TrackerManager:
 
         # Global greedy matching (sorted pair scores) is more stable than "per detection"
         # greedy loops when multiple faces are present.
-        pairs: List[Tuple[float, float, float, int, int]] = []  # (score, iou, -dist, tid, det_idx)
-        iou_thr = float(self.cfg.track_iou_match_threshold)
-        center_px = float(self.cfg.track_center_match_px)
-
-        for det_idx, (box, _det) in enumerate(valid):
-            bx1, by1, bx2, by2 = box
-            bw = max(1, bx2 - bx1)
-            bh = max(1, by2 - by1)
-            b_area = float(bw * bh)
-            for tid, tr in self._tracks.items():
-                tx1, ty1, tx2, ty2 = tr.bbox
-                tw = max(1, tx2 - tx1)
-                th = max(1, ty2 - ty1)
-                t_area = float(tw * th)
-                area_ratio = b_area / (t_area + 1e-6)
-                if area_ratio < 0.50 or area_ratio > 2.00:
-                    continue
-
-                iou = _bbox_iou(tr.bbox, box)
-                dist = _center_dist(tr.bbox, box)
-
-                max_dim = float(max(tw, th, bw, bh))
-                # Avoid matching across people: require centers to be close relative to box size.
-                eff_center = min(center_px, 0.80 * max_dim)
-
-                if iou < iou_thr and dist > eff_center:
-                    continue
-
-                # Score: prioritize IoU, lightly penalize normalized distance.
-                score = float(iou) - float(dist) / max(1.0, (eff_center * 4.0))
-                pairs.append((score, float(iou), -float(dist), int(tid), int(det_idx)))
-
-        pairs.sort(reverse=True)
-
-        for _score, iou, neg_dist, tid, det_idx in pairs:
+        tids = list(self._tracks.keys())
+        pairs = _scored_pairs(
+            np.asarray([self._tracks[t].bbox for t in tids], dtype=np.int64).reshape(-1, 4),
+            np.asarray([box for box, _det in valid], dtype=np.int64).reshape(-1, 4),
+            np.asarray(tids, dtype=np.int64),
+            float(self.cfg.track_iou_match_threshold),
+            float(self.cfg.track_center_match_px),
+        )
+
+        for tid, det_idx, iou, dist in pairs:
             if tid in assigned_tracks or det_idx in assigned_dets:
                 continue
             assigned_tracks.add(tid)
@@ -259,7 +271,6 @@ class TrackerManager:
 
             box, det = valid[det_idx]
             tr = self._tracks[tid]
-            dist = float(-neg_dist)
 
             # If a known track is re-associated with weak overlap or large center jump,
             # treat it as a re-acquire to avoid carrying identity across people.